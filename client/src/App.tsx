@@ -172,7 +172,8 @@ const App = () => {
                     status: newReportData.status || 'processing',
                     createdAt: newReportData.createdAt || new Date().toISOString(),
                     llm_status: newReportData.llm_status || 'pending',
-                    hasPdf: newReportData.hasPdf || false
+                    hasPdf: newReportData.hasPdf || false,
+                    analysisMode: newReportData.analysisMode || formData.analysisMode
                 },
                 ...prevReports
             ]);
@@ -28,7 +28,8 @@ const ReportForm: React.FC<ReportFormProps> = ({ onSubmit }) => {
         githubUrl: "",
         email: "",
         startDate: "",
-        endDate: ""
+        endDate: "",
+        analysisMode: "full"
     }
   });
 
@@ -151,6 +152,18 @@ const ReportForm: React.FC<ReportFormProps> = ({ onSubmit }) => {
           </div>
         </div>
 
+        <div className="form-group">
+          <label htmlFor="analysisMode">Режим анализа</label>
+          <select
+            id="analysisMode"
+            {...register("analysisMode")}
+            disabled={isSubmitting}
+          >
+            <option value="full">Полные файлы</option>
+            <option value="diff">Только изменения (diff)</option>
+          </select>
+        </div>
+
         <button type="submit" className="primary-btn" disabled={isSubmitting} style={{marginTop: '1rem'}}>
           {isSubmitting ? 'Генерация...' : 'Сформировать отчет'}
         </button>
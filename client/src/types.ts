@@ -7,11 +7,15 @@ export interface Report {
   createdAt: string;
   llm_status?: 'pending' | 'processing' | 'completed' | 'failed' | 'skipped';
   hasPdf?: boolean;
+  analysisMode?: AnalysisMode;
 }
 
+export type AnalysisMode = 'full' | 'diff';
+
 export interface ReportFormData {
   githubUrl: string;
   email: string;
   startDate: string;
   endDate: string;
+  analysisMode: AnalysisMode;
 }
\ No newline at end of file
@@ -1,4 +1,5 @@
 from flask import Flask
+from flask.helpers import get_debug_flag
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
@@ -29,5 +30,27 @@ if not os.path.exists(Config.REPORT_DIR):
 register_routes(app)
 register_auth_routes(app)
 
+
+@app.cli.command('gc-report-blobs')
+def gc_report_blobs():
+    from reports import collect_report_garbage
+    stats = collect_report_garbage()
+    print(f"Kept {stats['kept']} blobs, removed {stats['removed']}, freed {stats['freed_bytes']} bytes")
+
+
+if Config.PRELOAD_FONTS:
+    from llm_processor import PDFGenerator
+    PDFGenerator.preload_fonts()
+
+def is_serving_process() -> bool:
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        return True
+    return not (Config.DEBUG or get_debug_flag())
+
+
+if Config.WORKER_EMBEDDED_THREADS and is_serving_process():
+    from worker import start_embedded_workers
+    start_embedded_workers(Config.WORKER_EMBEDDED_THREADS)
+
 if __name__ == '__main__':
     app.run(debug=Config.DEBUG, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+from github_api import iter_repository_files
+from models import db, BatchReport
+from config import Config
+from report_storage import ReportWriter
+from content_store import content_store
+from reports import collapse_files
+from llm_processor import CodeAnalyzer, PDFGenerator, AUTHOR_STATS_HEADER
+
+logger = logging.getLogger(__name__)
+
+REPOSITORY_STATS_HEADER = ["Репозиторий", "Автор", "Файлов", "Изменений в коммитах"]
+SUMMARY_EXCERPT_CHARS = 1500
+
+
+def repository_name(repo_url: str) -> str:
+    return "/".join(repo_url.replace("https://github.com/", "").rstrip('/').split("/")[:2])
+
+
+def author_pdf_name(email: str) -> str:
+    return f"analysis_{re.sub(r'[^A-Za-z0-9_.-]+', '_', email)}.pdf"
+
+
+def _iter_repository(repo_url: str, start_date: str, end_date: str, emails: list,
+                     analysis_mode: str, commit_counts: dict) -> Iterator[dict]:
+    prefix = repository_name(repo_url)
+    files = (
+        dict(file_data, filename=f"{prefix}/{file_data['filename']}", repository=prefix)
+        for file_data in iter_repository_files(repo_url, start_date, end_date, emails, mode=analysis_mode)
+    )
+    yield from collapse_files(files, analysis_mode, commit_counts)
+
+
+def _hydrate(records: Iterable[dict]) -> Iterator[dict]:
+    for record in records:
+        if 'code_ref' in record:
+            record = dict(record)
+            record['code'] = content_store.get(record.pop('code_ref'))
+        yield record
+
+
+def fetch_batch_files(batch: BatchReport, commit_counts: dict) -> dict:
+    start_date, end_date = batch.date_range.split(' - ')
+    emails = batch.get_emails()
+    by_author = defaultdict(list)
+
+    with ReportWriter(batch.id, batch.report_dir_path) as writer:
+        for repo_url in batch.get_repos():
+            fetched = 0
+            for file_data in _iter_repository(repo_url, start_date, end_date, emails,
+                                              batch.analysis_mode, commit_counts):
+                by_author[file_data['author_email']].append(writer.write(file_data))
+                fetched += 1
+            logger.info(f"[batch {batch.id}] {repo_url}: {fetched} distinct files")
+    return by_author
+
+
+def _analyze_author(analyzer: CodeAnalyzer, email: str, records: list, commit_counts: dict,
+                    executor: ThreadPoolExecutor, date_range: str, output_dir: str) -> dict:
+    author_analyzer = analyzer.for_new_report()
+    author_analyzer.analyze_files(_hydrate(records), commit_counts, executor=executor)
+    pdf_path = os.path.join(output_dir, author_pdf_name(email))
+    author_analyzer.generate_report_pdf(pdf_path, f"Анализ кода {email} ({date_range})")
+
+    repositories = defaultdict(lambda: [0, 0])
+    for record in records:
+        repositories[record['repository']][0] += 1
+        repositories[record['repository']][1] += commit_counts.get((email, record['filename']), 1)
+
+    return {
+        'pdf_path': pdf_path,
+        'files': author_analyzer.total_files,
+        'author_rows': author_analyzer.author_rows(),
+        'repositories': dict(repositories),
+        'general_analysis': author_analyzer.general_analysis_text or ''
+    }
+
+
+def _summary_content(batch: BatchReport, results: dict) -> str:
+    blocks = [
+        "=== СВОДНЫЙ ОТЧЕТ ===\n"
+        f"Период: {batch.date_range}\n"
+        f"Режим анализа: {batch.analysis_mode}\n"
+        f"Репозитории: {', '.join(repository_name(repo) for repo in batch.get_repos())}\n"
+        f"Авторов с изменениями: {sum(1 for r in results.values() if r['files'])} из {len(results)}"
+    ]
+    for email, result in results.items():
+        if not result['files']:
+            blocks.append(f"### {email}\nНе найдено коммитов или файлов для анализа.")
+            continue
+        excerpt = result['general_analysis'].strip().replace('\n\n', '\n')
+        if len(excerpt) > SUMMARY_EXCERPT_CHARS:
+            excerpt = excerpt[:SUMMARY_EXCERPT_CHARS].rsplit(' ', 1)[0] + "..."
+        blocks.append(f"### {email}\n{excerpt}")
+    return "\n\n".join(blocks)
+
+
+def generate_summary_pdf(batch: BatchReport, results: dict, output_path: str) -> str:
+    author_rows = [row for result in results.values() for row in result['author_rows']]
+    repository_rows = [
+        [repository, email, counts[0], counts[1]]
+        for email, result in results.items()
+        for repository, counts in sorted(result['repositories'].items())
+    ]
+    tables = []
+    if author_rows:
+        tables.append(("Статистика по авторам", AUTHOR_STATS_HEADER, author_rows))
+    if repository_rows:
+        tables.append(("Статистика по репозиториям", REPOSITORY_STATS_HEADER, repository_rows))
+    PDFGenerator.save_to_pdf(output_path, f"Сводный отчет по команде ({batch.date_range})",
+                             _summary_content(batch, results), tables or None)
+    return output_path
+
+
+def process_batch_report(batch_id: str) -> str:
+    from app import app
+    with app.app_context():
+        batch = db.session.get(BatchReport, batch_id)
+        if not batch:
+            logger.error(f"Batch report {batch_id} not found in database for processing. Aborting.")
+            return 'skipped'
+
+        final_status = 'failed'
+        results = {}
+        try:
+            batch.status = 'processing'
+            db.session.commit()
+            emails = batch.get_emails()
+            logger.info(f"[batch {batch_id}] Processing {len(batch.get_repos())} repositories for "
+                        f"{len(emails)} authors, Range: {batch.date_range}, Mode: {batch.analysis_mode}")
+
+            commit_counts = {}
+            by_author = fetch_batch_files(batch, commit_counts)
+
+            output_dir = os.path.join(Config.LLM_REPORT_DIR, f"batch_{batch_id}")
+            os.makedirs(output_dir, exist_ok=True)
+
+            futures = {}
+            if by_author:
+                if not Config.YANDEX_FOLDER_ID or not Config.YANDEX_AUTH_TOKEN:
+                    raise ValueError("Yandex credentials not configured in environment/config.")
+                analyzer = CodeAnalyzer(folder_id=Config.YANDEX_FOLDER_ID, auth_token=Config.YANDEX_AUTH_TOKEN)
+                with ThreadPoolExecutor(max_workers=Config.BATCH_LLM_MAX_WORKERS) as llm_executor, \
+                        ThreadPoolExecutor(max_workers=Config.BATCH_AUTHOR_CONCURRENCY) as author_executor:
+                    for email in emails:
+                        if by_author.get(email):
+                            futures[email] = author_executor.submit(
+                                _analyze_author, analyzer, email, by_author[email], commit_counts,
+                                llm_executor, batch.date_range, output_dir
+                            )
+
+            for email in emails:
+                if email in futures:
+                    results[email] = futures[email].result()
+                else:
+                    logger.info(f"[batch {batch_id}] No files found for author {email}")
+                    results[email] = {'pdf_path': None, 'files': 0, 'author_rows': [],
+                                      'repositories': {}, 'general_analysis': ''}
+
+            batch.summary_pdf_path = generate_summary_pdf(
+                batch, results, os.path.join(output_dir, f"summary_{batch_id}.pdf")
+            )
+            final_status = 'completed'
+            logger.info(f"[batch {batch_id}] Batch report completed: {batch.summary_pdf_path}")
+
+        except Exception as e:
+            logger.error(f"[batch {batch_id}] Error in processing batch report: {e}", exc_info=True)
+            final_status = 'failed'
+
+        finally:
+            try:
+                batch = db.session.get(BatchReport, batch_id)
+                if batch:
+                    batch.status = final_status
+                    batch.results = json.dumps({
+                        email: {'pdf_path': result['pdf_path'], 'files': result['files']}
+                        for email, result in results.items()
+                    }, ensure_ascii=False)
+                    if final_status != 'completed':
+                        batch.summary_pdf_path = None
+                    db.session.commit()
+            except Exception as db_err:
+                db.session.rollback()
+                logger.error(f"[batch {batch_id}] CRITICAL: Failed to update batch status to '{final_status}': {db_err}",
+                             exc_info=True)
+
+        return final_status
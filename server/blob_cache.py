@@ -0,0 +1,133 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+RESCAN_FRACTION = 0.1
+
+
+class BlobCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = None
+        self._total_bytes = 0
+        self._unscanned_bytes = 0
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.cache_dir, sha[:2], sha[2:])
+
+    def _load_index(self):
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith('.tmp'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    sha = os.path.basename(root) + name
+                    entries.append((st.st_mtime, sha, st.st_size))
+
+        entries.sort()
+        self._entries = OrderedDict((sha, size) for _, sha, size in entries)
+        self._total_bytes = sum(self._entries.values())
+        self._unscanned_bytes = 0
+        logger.info(f"Кэш блобов загружен: {len(self._entries)} записей, {self._total_bytes} байт")
+
+    def _ensure_index(self):
+        if self._entries is None:
+            self._load_index()
+
+    def get(self, sha: str) -> Optional[str]:
+        if not sha:
+            return None
+        with self._lock:
+            self._ensure_index()
+            if sha not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sha)
+
+        path = self._path(sha)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(sha, 0)
+                self._total_bytes -= size
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, sha: str, content: str):
+        if not sha or content is None:
+            return
+        data = content.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(sha)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Не удалось записать блоб {sha} в кэш: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._ensure_index()
+            self._unscanned_bytes += len(data)
+            if self._unscanned_bytes >= self.max_bytes * RESCAN_FRACTION:
+                self._load_index()
+            self._total_bytes -= self._entries.pop(sha, 0)
+            self._entries[sha] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            sha, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(sha))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries) if self._entries is not None else 0,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+blob_cache = BlobCache(Config.BLOB_CACHE_DIR, Config.BLOB_CACHE_MAX_BYTES)
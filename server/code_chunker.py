@@ -0,0 +1,94 @@
+import os
+import re
+from typing import List
+
+C_LIKE_DEFINITION = (
+    r'^(?:[A-Za-z_][\w:<>,\*&\s]*\s[\*&]?[A-Za-z_][\w:~]*\s*\([^;]*$'
+    r'|(?:class|struct|namespace|enum)\s+\w+)'
+)
+
+BOUNDARY_PATTERNS = {
+    '.py': r'^(?:@|(?:async\s+)?def\s|class\s)',
+    '.js': r'^(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function\b|class\b|const\b|let\b|var\b)',
+    '.ts': r'^(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?'
+           r'(?:function\b|class\b|const\b|let\b|var\b|interface\b|type\b|enum\b|namespace\b)',
+    '.java': r'^\s{0,4}(?:@\w+|(?:public|private|protected|static|final|abstract|class|interface|enum|record)\b)',
+    '.cs': r'^\s{0,8}(?:\[\w+|(?:public|private|protected|internal|static|sealed|abstract|class|interface|enum|record|namespace)\b)',
+    '.kt': r'^\s{0,4}(?:@\w+|(?:fun|class|object|interface|data|sealed|enum|private|internal|public|override)\b)',
+    '.scala': r'^\s{0,2}(?:def|class|object|trait|case\s+class|sealed|implicit|private|override)\b',
+    '.swift': r'^\s{0,4}(?:@\w+|(?:func|class|struct|enum|protocol|extension|public|private|internal|fileprivate|override)\b)',
+    '.go': r'^(?:func|type|var|const)\b',
+    '.c': C_LIKE_DEFINITION,
+    '.cpp': C_LIKE_DEFINITION,
+    '.php': r'^\s{0,4}(?:(?:abstract|final)\s+)?(?:class|interface|trait|function)\b'
+            r'|^\s{0,4}(?:public|private|protected)\s+(?:static\s+)?function\b',
+    '.rb': r'^\s{0,2}(?:def|class|module)\s',
+    '.html': r'^\s*<(?:head|body|script|style|section|header|footer|main|nav|form|template)\b',
+    '.css': r'^[^\s{}@/][^{]*\{|^@(?:media|supports|keyframes|font-face)\b',
+}
+BOUNDARY_PATTERNS['.tsx'] = BOUNDARY_PATTERNS['.ts']
+
+_COMPILED_PATTERNS = {ext: re.compile(pattern) for ext, pattern in BOUNDARY_PATTERNS.items()}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 3 + 1
+
+
+def _boundary_segments(lines: List[str], pattern) -> List[List[str]]:
+    segments = []
+    current = []
+    for line in lines:
+        if pattern is not None and current and pattern.match(line):
+            segments.append(current)
+            current = []
+        current.append(line)
+    if current:
+        segments.append(current)
+    return segments
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    max_chars = max(1, (max_tokens - 1) * 3)
+    parts = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + len(line) > max_chars:
+            parts.append(current)
+            current = ""
+        current += line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_code(code: str, filename: str, max_tokens: int) -> List[str]:
+    if estimate_tokens(code) <= max_tokens:
+        return [code]
+
+    pattern = _COMPILED_PATTERNS.get(os.path.splitext(filename)[1].lower())
+    segments = _boundary_segments(code.splitlines(keepends=True), pattern)
+
+    chunks = []
+    current = ""
+    for segment in segments:
+        text = "".join(segment)
+        if estimate_tokens(text) > max_tokens:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_oversized(text, max_tokens))
+            continue
+        if current and estimate_tokens(current + text) > max_tokens:
+            chunks.append(current)
+            current = ""
+        current += text
+    if current:
+        chunks.append(current)
+    return chunks
@@ -3,15 +3,69 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _load_github_tokens() -> list:
+    tokens = [os.getenv('GITHUB_TOKEN') or '']
+    tokens += os.getenv('GITHUB_TOKENS', '').split(',')
+    tokens_file = os.getenv('GITHUB_TOKENS_FILE')
+    if tokens_file and os.path.exists(tokens_file):
+        with open(tokens_file, 'r', encoding='utf-8') as f:
+            tokens += [line for line in f if not line.startswith('#')]
+    return list(dict.fromkeys(token.strip() for token in tokens if token.strip()))
+
+
 class Config:
-    GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
+    GITHUB_TOKENS = _load_github_tokens()
+    GITHUB_TOKEN = GITHUB_TOKENS[0] if GITHUB_TOKENS else None
+    GITHUB_BACKEND = os.getenv('GITHUB_BACKEND', 'rest')
+    GITHUB_GRAPHQL_BLOB_BATCH = int(os.getenv('GITHUB_GRAPHQL_BLOB_BATCH', '50'))
+    GIT_MIRROR_DIR = os.path.abspath(os.getenv('GIT_MIRROR_DIR', "git_mirrors"))
+    GIT_BINARY = os.getenv('GIT_BINARY', 'git')
+    GIT_COMMAND_TIMEOUT = int(os.getenv('GIT_COMMAND_TIMEOUT', '120'))
+    GIT_FETCH_TIMEOUT = int(os.getenv('GIT_FETCH_TIMEOUT', '1800'))
+    GITHUB_MAX_WORKERS = int(os.getenv('GITHUB_MAX_WORKERS', '8'))
+    GITHUB_MAX_BLOB_BYTES = int(os.getenv('GITHUB_MAX_BLOB_BYTES', str(1024 * 1024)))
+    GITHUB_MAX_RETRIES = int(os.getenv('GITHUB_MAX_RETRIES', '3'))
+    GITHUB_RATE_LIMIT_RESERVE = int(os.getenv('GITHUB_RATE_LIMIT_RESERVE', '10'))
+    GITHUB_RATE_LIMIT_PACING_THRESHOLD = float(os.getenv('GITHUB_RATE_LIMIT_PACING_THRESHOLD', '0.2'))
+    GITHUB_SECONDARY_BACKOFF = int(os.getenv('GITHUB_SECONDARY_BACKOFF', '60'))
+    GITHUB_RATE_STATE_PATH = os.path.abspath(
+        os.getenv('GITHUB_RATE_STATE_PATH', os.path.join("http_cache", "rate_limits.sqlite3"))
+    )
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', str(max(GITHUB_MAX_WORKERS, 10))))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
     REPORT_DIR = os.path.abspath("reports")
     LLM_REPORT_DIR = os.path.abspath("llm_reports")
+    FONT_DIR = os.path.abspath(os.getenv('FONT_DIR', "fonts"))
+    FONT_DOWNLOAD_ENABLED = os.getenv('FONT_DOWNLOAD_ENABLED', 'True').lower() == 'true'
+    PRELOAD_FONTS = os.getenv('PRELOAD_FONTS', 'True').lower() == 'true'
+    REPORT_BLOB_DIR = os.path.abspath(os.getenv('REPORT_BLOB_DIR', "report_blobs"))
+    REPORT_COMPRESSION_LEVEL = int(os.getenv('REPORT_COMPRESSION_LEVEL', '6'))
+    REPORT_BLOB_GC_GRACE_SECONDS = int(os.getenv('REPORT_BLOB_GC_GRACE_SECONDS', str(24 * 3600)))
+    BLOB_CACHE_DIR = os.path.abspath(os.getenv('BLOB_CACHE_DIR', "blob_cache"))
+    BLOB_CACHE_MAX_BYTES = int(os.getenv('BLOB_CACHE_MAX_MB', '512')) * 1024 * 1024
+    HTTP_CACHE_PATH = os.path.abspath(os.getenv('HTTP_CACHE_PATH', os.path.join("http_cache", "responses.sqlite3")))
+    HTTP_CACHE_MAX_BYTES = int(os.getenv('HTTP_CACHE_MAX_MB', '256')) * 1024 * 1024
     ALLOWED_EXTENSIONS = {
         '.py', '.js', '.ts', '.tsx', '.html', '.css',
         '.java', '.cpp', '.c', '.cs', '.go', '.php',
         '.rb', '.swift', '.kt', '.scala'
     }
+    ANALYSIS_MODES = ('full', 'diff')
+    REPORT_ANALYSIS_MODE = os.getenv('REPORT_ANALYSIS_MODE', 'full')
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '32'))
+    BATCH_MAX_REPOS = int(os.getenv('BATCH_MAX_REPOS', '20'))
+    BATCH_MAX_AUTHORS = int(os.getenv('BATCH_MAX_AUTHORS', '50'))
+    BATCH_AUTHOR_CONCURRENCY = int(os.getenv('BATCH_AUTHOR_CONCURRENCY', '4'))
+    WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '2'))
+    WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '2'))
+    WORKER_EMBEDDED_THREADS = int(os.getenv('WORKER_EMBEDDED_THREADS', '0'))
+    JOB_DEFAULT_PRIORITY = int(os.getenv('JOB_DEFAULT_PRIORITY', '0'))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    JOB_RETRY_BASE_DELAY = int(os.getenv('JOB_RETRY_BASE_DELAY', '30'))
+    JOB_STALE_TIMEOUT = int(os.getenv('JOB_STALE_TIMEOUT', str(6 * 3600)))
     CORS_ORIGINS = ["http://localhost:3000"]
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
@@ -22,4 +76,17 @@ class Config:
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY')
 
     YANDEX_FOLDER_ID = os.getenv('YANDEX_FOLDER_ID')
-    YANDEX_AUTH_TOKEN = os.getenv('YANDEX_AUTH_TOKEN')
\ No newline at end of file
+    YANDEX_AUTH_TOKEN = os.getenv('YANDEX_AUTH_TOKEN')
+    LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', '4'))
+    LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '60'))
+    BATCH_LLM_MAX_WORKERS = int(os.getenv('BATCH_LLM_MAX_WORKERS', str(LLM_MAX_WORKERS * 2)))
+    LLM_CHUNK_MAX_TOKENS = int(os.getenv('LLM_CHUNK_MAX_TOKENS', '1800'))
+    LLM_SUMMARY_MAX_TOKENS = int(os.getenv('LLM_SUMMARY_MAX_TOKENS', '2000'))
+    LLM_DIGEST_MAX_TOKENS = int(os.getenv('LLM_DIGEST_MAX_TOKENS', '700'))
+    LLM_BATCH_ENABLED = os.getenv('LLM_BATCH_ENABLED', 'True').lower() == 'true'
+    LLM_BATCH_SMALL_FILE_TOKENS = int(os.getenv('LLM_BATCH_SMALL_FILE_TOKENS', '300'))
+    LLM_BATCH_MAX_TOKENS = int(os.getenv('LLM_BATCH_MAX_TOKENS', '1000'))
+    LLM_BATCH_MAX_FILES = int(os.getenv('LLM_BATCH_MAX_FILES', '8'))
+    LLM_CACHE_PATH = os.path.abspath(os.getenv('LLM_CACHE_PATH', os.path.join("llm_cache", "completions.sqlite3")))
+    LLM_CACHE_TTL_DAYS = int(os.getenv('LLM_CACHE_TTL_DAYS', '30'))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '50000'))
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+import gzip
+import time
+import hashlib
+import threading
+import logging
+from typing import Optional, Dict, Iterable
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ContentStore:
+    def __init__(self, store_dir: str, compression_level: int):
+        self.store_dir = store_dir
+        self.compression_level = compression_level
+        self.writes = 0
+        self.dedup_hits = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.store_dir, digest[:2], f"{digest[2:]}.gz")
+
+    def put(self, content: str) -> str:
+        digest = self.digest(content)
+        path = self._path(digest)
+        if os.path.exists(path):
+            try:
+                os.utime(path)
+                with self._lock:
+                    self.dedup_hits += 1
+                return digest
+            except OSError:
+                pass
+
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(content.encode('utf-8'), compresslevel=self.compression_level))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.writes += 1
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        if not digest:
+            return None
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return gzip.decompress(f.read()).decode('utf-8')
+        except (OSError, EOFError) as e:
+            logger.error(f"Content blob {digest} could not be read: {e}")
+            return None
+
+    def iter_digests(self) -> Iterable[tuple]:
+        if not os.path.isdir(self.store_dir):
+            return
+        for root, _, files in os.walk(self.store_dir):
+            for name in files:
+                if not name.endswith('.gz'):
+                    continue
+                path = os.path.join(root, name)
+                yield os.path.basename(root) + name[:-3], path
+
+    def collect_garbage(self, referenced: set, grace_seconds: int) -> Dict:
+        cutoff = time.time() - grace_seconds
+        kept = removed = freed_bytes = 0
+        for digest, path in self.iter_digests():
+            if digest in referenced:
+                kept += 1
+                continue
+            try:
+                st = os.stat(path)
+                if st.st_mtime > cutoff:
+                    kept += 1
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed_bytes += st.st_size
+        logger.info(f"Content store GC: kept {kept}, removed {removed} blobs, freed {freed_bytes} bytes")
+        return {'kept': kept, 'removed': removed, 'freed_bytes': freed_bytes}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'writes': self.writes, 'dedup_hits': self.dedup_hits}
+
+
+content_store = ContentStore(Config.REPORT_BLOB_DIR, Config.REPORT_COMPRESSION_LEVEL)
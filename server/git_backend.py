@@ -0,0 +1,222 @@
+import os
+import re
+import base64
+import hashlib
+import logging
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+from config import Config
+from github_api import author_emails
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+GIT_ENV = dict(os.environ, TZ='UTC', GIT_TERMINAL_PROMPT='0')
+_DIFF_HEADER_RE = re.compile(r'^diff --git ', re.MULTILINE)
+
+
+class GitBackendError(RuntimeError):
+    pass
+
+
+def _run_git(args: List[str], git_dir: Optional[str] = None, timeout: Optional[int] = None,
+             env: Optional[Dict[str, str]] = None) -> bytes:
+    command = [Config.GIT_BINARY]
+    if git_dir:
+        command += ['--git-dir', git_dir]
+    command += args
+    try:
+        result = subprocess.run(command, capture_output=True, env=dict(GIT_ENV, **env) if env else GIT_ENV,
+                                timeout=timeout or Config.GIT_COMMAND_TIMEOUT)
+    except subprocess.TimeoutExpired as e:
+        raise GitBackendError(f"git {args[0]} превысил таймаут {e.timeout} с") from e
+    if result.returncode != 0:
+        raise GitBackendError(f"git {args[0]} завершился с кодом {result.returncode}: "
+                              f"{result.stderr.decode('utf-8', errors='ignore').strip()}")
+    return result.stdout
+
+
+def _auth_env(repo_url: str) -> Dict[str, str]:
+    if not Config.GITHUB_TOKEN or not repo_url.startswith('https://github.com/'):
+        return {}
+    credentials = base64.b64encode(f"x-access-token:{Config.GITHUB_TOKEN}".encode()).decode()
+    return {
+        'GIT_CONFIG_COUNT': '1',
+        'GIT_CONFIG_KEY_0': 'http.https://github.com/.extraheader',
+        'GIT_CONFIG_VALUE_0': f"AUTHORIZATION: basic {credentials}"
+    }
+
+
+def mirror_path(repo_url: str) -> str:
+    normalized = repo_url.rstrip('/')
+    if normalized.endswith('.git'):
+        normalized = normalized[:-4]
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', normalized.split('://')[-1])[-80:]
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(Config.GIT_MIRROR_DIR, f"{name}-{digest}.git")
+
+
+@contextmanager
+def _mirror_lock(path: str):
+    os.makedirs(Config.GIT_MIRROR_DIR, exist_ok=True)
+    with open(f"{path}.lock", 'w') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def ensure_mirror(repo_url: str) -> str:
+    path = mirror_path(repo_url)
+    with _mirror_lock(path):
+        if os.path.isdir(path):
+            logger.info(f"Обновление зеркала {repo_url} в {path}")
+            _run_git(['fetch', '--prune', '--quiet', 'origin'],
+                     git_dir=path, timeout=Config.GIT_FETCH_TIMEOUT, env=_auth_env(repo_url))
+        else:
+            logger.info(f"Создание зеркала {repo_url} в {path}")
+            _run_git(['clone', '--mirror', '--quiet', repo_url, path],
+                     timeout=Config.GIT_FETCH_TIMEOUT, env=_auth_env(repo_url))
+    return path
+
+
+def _iter_commits(git_dir: str, start_date: str, end_date: str, author_email: Union[str, Iterable[str]]) -> Iterator[tuple]:
+    emails = author_emails(author_email)
+    output = _run_git([
+        'log', 'HEAD', '-z',
+        f"--since={start_date}T00:00:00Z", f"--until={end_date}T00:00:00Z",
+        '--fixed-strings'
+    ] + [f"--author={email}" for email in emails] + [
+        '--date=iso-strict-local', '--format=%H%x1f%P%x1f%ae%x1f%ad'
+    ], git_dir=git_dir)
+    for entry in output.decode('utf-8', errors='ignore').split('\0'):
+        if not entry.strip():
+            continue
+        commit_sha, parents, email, date = entry.strip('\n').split('\x1f')
+        if email not in emails:
+            continue
+        yield commit_sha, (parents.split() or [None])[0], date.replace('+00:00', 'Z'), email
+
+
+def _commit_files(git_dir: str, commit_sha: str, parent_sha: Optional[str]) -> List[Dict]:
+    revisions = [parent_sha, commit_sha] if parent_sha else ['--root', commit_sha]
+    output = _run_git(['diff-tree', '-r', '--no-commit-id', '-z'] + revisions, git_dir=git_dir)
+    fields = output.decode('utf-8', errors='ignore').split('\0')
+
+    commit_files = []
+    for meta, filename in zip(fields[0::2], fields[1::2]):
+        parts = meta.split()
+        if len(parts) < 5:
+            continue
+        blob_sha, status = parts[3], parts[4]
+        if status.startswith('D'):
+            continue
+        if not any(filename.endswith(ext) for ext in Config.ALLOWED_EXTENSIONS):
+            continue
+        commit_files.append({'filename': filename, 'sha': blob_sha})
+    return commit_files
+
+
+def _commit_patches(git_dir: str, commit_sha: str, parent_sha: Optional[str], filenames: List[str]) -> Dict[str, str]:
+    if not filenames:
+        return {}
+    revisions = [parent_sha, commit_sha] if parent_sha else ['--root', commit_sha]
+    output = _run_git(['diff-tree', '-p', '--no-commit-id', '--no-color'] + revisions + ['--'] + filenames,
+                      git_dir=git_dir).decode('utf-8', errors='ignore')
+
+    patches = {}
+    sections = _DIFF_HEADER_RE.split(output)[1:]
+    for filename, section in zip(_section_filenames(sections), sections):
+        hunk_start = section.find('\n@@')
+        if filename and hunk_start != -1:
+            patches[filename] = section[hunk_start + 1:].rstrip('\n')
+    return patches
+
+
+def _section_filenames(sections: List[str]) -> Iterator[Optional[str]]:
+    for section in sections:
+        match = re.search(r'^\+\+\+ b/(.+)$', section, re.MULTILINE)
+        yield match.group(1) if match else None
+
+
+class CatFileBatch:
+    def __init__(self, git_dir: str):
+        self.git_dir = git_dir
+        self._process = None
+
+    def __enter__(self):
+        self._process = subprocess.Popen(
+            [Config.GIT_BINARY, '--git-dir', self.git_dir, 'cat-file', '--batch'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=GIT_ENV
+        )
+        return self
+
+    def read(self, blob_sha: str, filename: str) -> Optional[str]:
+        self._process.stdin.write(f"{blob_sha}\n".encode())
+        self._process.stdin.flush()
+        header = self._process.stdout.readline().decode().split()
+        if len(header) != 3:
+            logger.warning(f"Блоб {blob_sha} ({filename}) не найден в зеркале")
+            return None
+
+        size = int(header[2])
+        data = self._process.stdout.read(size)
+        self._process.stdout.read(1)
+        if size > Config.GITHUB_MAX_BLOB_BYTES:
+            logger.warning(f"Файл {filename} больше {Config.GITHUB_MAX_BLOB_BYTES} байт, пропускаем")
+            return None
+        return data.decode('utf-8', errors='ignore')
+
+    def __exit__(self, exc_type, exc, tb):
+        self._process.stdin.close()
+        self._process.wait(timeout=10)
+        self._process.stdout.close()
+        return False
+
+
+def iter_git_files(repo_url: str, start_date: str, end_date: str, author_email: Union[str, Iterable[str]],
+                   mode: str = 'full') -> Iterator[Dict]:
+    git_dir = ensure_mirror(repo_url)
+    content_type = 'diff' if mode == 'diff' else 'file'
+    commits = 0
+    with CatFileBatch(git_dir) as cat_file:
+        for commit_sha, parent_sha, commit_date, commit_email in _iter_commits(git_dir, start_date, end_date, author_email):
+            commits += 1
+            commit_files = _commit_files(git_dir, commit_sha, parent_sha)
+            if mode == 'diff':
+                patches = _commit_patches(git_dir, commit_sha, parent_sha, [f['filename'] for f in commit_files])
+            for commit_file in commit_files:
+                if mode == 'diff':
+                    code = patches.get(commit_file['filename']) or None
+                else:
+                    code = cat_file.read(commit_file['sha'], commit_file['filename'])
+                if code is None:
+                    continue
+                yield {
+                    'filename': commit_file['filename'],
+                    'commit_sha': commit_sha,
+                    'commit_date': commit_date,
+                    'author_email': commit_email,
+                    'content_type': content_type,
+                    'code': code
+                }
+    logger.info(f"Git-зеркало {repo_url}: обработано коммитов {commits}")
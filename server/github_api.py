@@ -1,111 +1,434 @@
-import base64
-import time
+import re
 import requests
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from config import Config
-from typing import List, Dict
+from blob_cache import blob_cache
+from rate_limiter import rate_governor
+from http_client import get_session
+from http_cache import response_cache
+from typing import List, Dict, Optional, Iterator, Iterable, Union
 
 logger = logging.getLogger(__name__)
 
-def check_rate_limit():
+def author_emails(author_email: Union[str, Iterable[str]]) -> List[str]:
+    if isinstance(author_email, str):
+        return [author_email]
+    return list(dict.fromkeys(author_email))
+
+def _with_token(headers: Optional[Dict], token: Optional[str], scheme: str = "token") -> Dict:
+    request_headers = dict(headers or {})
+    if token:
+        request_headers['Authorization'] = f"{scheme} {token}"
+    return request_headers
+
+def github_get(url: str, headers: Optional[Dict] = None, **kwargs) -> requests.Response:
+    for attempt in range(Config.GITHUB_MAX_RETRIES + 1):
+        token = rate_governor.acquire()
+        response = get_session().get(url, headers=_with_token(headers, token), **kwargs)
+        if not rate_governor.update(response, token=token) or attempt == Config.GITHUB_MAX_RETRIES:
+            return response
+        response.close()
+    return response
+
+def cached_github_get(url: str, headers: Dict, params: Optional[Dict] = None, immutable: bool = False, **kwargs) -> requests.Response:
+    key = response_cache.make_key(url, params, headers.get('Accept'))
+    cached = response_cache.get(key, url)
+    if cached and cached.immutable:
+        response_cache.record_hit()
+        return cached.to_response()
+
+    request_headers = dict(headers)
+    if cached and cached.etag:
+        request_headers['If-None-Match'] = cached.etag
+
+    response = github_get(url, headers=request_headers, params=params, **kwargs)
+    if response.status_code == 304 and cached:
+        response_cache.record_hit(revalidated=True)
+        return cached.to_response()
+
+    if response.status_code == 200 and (immutable or response.headers.get('ETag')):
+        response_cache.put(key, response, immutable=immutable)
+    return response
+
+def _fetch_commit_files(owner: str, repo: str, commit_sha: str, headers: Dict) -> List[Dict]:
+    files_url = f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}"
     try:
-        response = requests.get(
-            "https://api.github.com/rate_limit",
-            headers={"Authorization": f"token {Config.GITHUB_TOKEN}"}
-        )
-        remaining = int(response.headers.get('X-RateLimit-Remaining', 0))
-        reset_time = int(response.headers.get('X-RateLimit-Reset', 0))
-        
-        if remaining < 10:
-            sleep_time = reset_time - time.time() + 10
-            if sleep_time > 0:
-                logger.warning(f"Приближаемся к лимиту. Ждем {sleep_time:.0f} сек")
-                time.sleep(sleep_time)
-    except Exception as e:
-        logger.error(f"Ошибка проверки лимитов: {str(e)}")
-
-def get_github_files(repo_url: str, start_date: str, end_date: str, author_email: str) -> List[Dict]:
+        files_response = cached_github_get(files_url, headers, immutable=True, timeout=10)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка получения коммита {commit_sha}: {e}")
+        return []
+
+    if files_response.status_code != 200:
+        return []
+
+    data = files_response.json()
+    if not isinstance(data, dict):
+        return []
+
+    commit_files = []
+    for file in data.get('files', []):
+        filename = file.get('filename', '')
+        if not filename:
+            continue
+
+        if not any(filename.endswith(ext) for ext in Config.ALLOWED_EXTENSIONS):
+            continue
+
+        if file.get('status') == 'removed':
+            continue
+
+        commit_files.append({
+            'filename': filename,
+            'sha': file.get('sha'),
+            'raw_url': file.get('raw_url'),
+            'patch': file.get('patch')
+        })
+    return commit_files
+
+def _read_raw_body(response: requests.Response, filename: str) -> Optional[bytes]:
+    chunks = []
+    total = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        total += len(chunk)
+        if total > Config.GITHUB_MAX_BLOB_BYTES:
+            logger.warning(f"Файл {filename} больше {Config.GITHUB_MAX_BLOB_BYTES} байт, пропускаем")
+            return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+def _fetch_file_content(owner: str, repo: str, filename: str, blob_sha: Optional[str], raw_url: Optional[str], headers: Dict) -> Optional[str]:
+    cached_content = blob_cache.get(blob_sha)
+    if cached_content is not None:
+        return cached_content
+
+    if blob_sha:
+        content_url = f"https://api.github.com/repos/{owner}/{repo}/git/blobs/{blob_sha}"
+    elif raw_url:
+        content_url = raw_url
+    else:
+        return None
+
+    raw_headers = dict(headers, Accept="application/vnd.github.raw")
     try:
-        parts = repo_url.replace("https://github.com/", "").split("/")
-        owner, repo = parts[0], parts[1]
-        
-        commits_url = f"https://api.github.com/repos/{owner}/{repo}/commits"
-        headers = {
-            "Authorization": f"token {Config.GITHUB_TOKEN}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        params = {
-            "since": start_date,
-            "until": end_date,
-            "author": author_email,
-            "per_page": 100
-        }
-        
-        check_rate_limit()
-        response = requests.get(commits_url, headers=headers, params=params, timeout=10)
+        with github_get(content_url, headers=raw_headers, timeout=10, stream=True) as content_response:
+            if content_response.status_code != 200:
+                return None
+            content = _read_raw_body(content_response, filename)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка получения файла {filename} ({blob_sha or raw_url}): {e}")
+        return None
+
+    if not content:
+        return None
+
+    decoded_content = content.decode('utf-8', errors='ignore')
+    blob_cache.put(blob_sha, decoded_content)
+    return decoded_content
+
+def iter_commits(commits_url: str, headers: Dict, params: Dict) -> Iterator[Dict]:
+    url = commits_url
+    page_params = params
+    page = 1
+    while url:
+        response = cached_github_get(url, headers, params=page_params, timeout=10)
         response.raise_for_status()
-        
+
         commits = response.json()
         if not isinstance(commits, list):
             logger.error(f"Неожиданный ответ от GitHub API: {commits}")
-            return []
-        
-        files_data = []
-        for commit in commits:
+            return
+
+        logger.debug(f"Получена страница коммитов {page}: {len(commits)} шт.")
+        yield from commits
+
+        url = response.links.get('next', {}).get('url')
+        page_params = None
+        page += 1
+
+def iter_github_files(repo_url: str, start_date: str, end_date: str, author_email: Union[str, Iterable[str]],
+                      mode: str = 'full') -> Iterator[Dict]:
+    parts = repo_url.replace("https://github.com/", "").split("/")
+    owner, repo = parts[0], parts[1]
+    emails = author_emails(author_email)
+
+    commits_url = f"https://api.github.com/repos/{owner}/{repo}/commits"
+    headers = {
+        "Accept": "application/vnd.github.v3+json"
+    }
+    params = {
+        "since": start_date,
+        "until": end_date,
+        "per_page": 100
+    }
+    if len(emails) == 1:
+        params["author"] = emails[0]
+
+    with ThreadPoolExecutor(max_workers=Config.GITHUB_MAX_WORKERS) as executor:
+        commit_futures = deque()
+        content_futures = deque()
+
+        def schedule_contents(block: bool):
+            while commit_futures and (block or commit_futures[0][3].done()):
+                commit_sha, commit_date, commit_email, future = commit_futures.popleft()
+                for commit_file in future.result():
+                    if mode == 'diff':
+                        if not commit_file['patch']:
+                            continue
+                        content = commit_file['patch']
+                    else:
+                        content = executor.submit(_fetch_file_content, owner, repo, commit_file['filename'],
+                                                  commit_file['sha'], commit_file['raw_url'], headers)
+                    content_futures.append((commit_file['filename'], commit_sha, commit_date, commit_email, content))
+
+        def ready_files(block: bool) -> Iterator[Dict]:
+            while content_futures:
+                content = content_futures[0][4]
+                if not block and isinstance(content, Future) and not content.done():
+                    return
+                filename, commit_sha, commit_date, commit_email, content = content_futures.popleft()
+                decoded_content = content.result() if isinstance(content, Future) else content
+                if decoded_content is None:
+                    continue
+
+                yield {
+                    'filename': filename,
+                    'commit_sha': commit_sha,
+                    'commit_date': commit_date,
+                    'author_email': commit_email,
+                    'content_type': 'diff' if mode == 'diff' else 'file',
+                    'code': decoded_content
+                }
+
+        for commit in iter_commits(commits_url, headers, params):
             commit_sha = commit.get('sha')
             if not commit_sha:
                 continue
-                
+
             commit_info = commit.get('commit', {})
             author_info = commit_info.get('author', {})
-            
-            if author_info.get('email') != author_email:
+
+            if author_info.get('email') not in emails:
                 continue
-                
+
             commit_date = author_info.get('date')
-            
-            files_url = f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}"
-            files_response = requests.get(files_url, headers=headers, timeout=10)
-            
-            if files_response.status_code != 200:
+            commit_futures.append((
+                commit_sha,
+                commit_date,
+                author_info['email'],
+                executor.submit(_fetch_commit_files, owner, repo, commit_sha, headers)
+            ))
+            schedule_contents(block=False)
+            yield from ready_files(block=False)
+
+        schedule_contents(block=True)
+        yield from ready_files(block=True)
+
+    cache_stats = blob_cache.stats()
+    logger.info(f"Кэш блобов: попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}, "
+                f"размер {cache_stats['bytes']} байт")
+    http_stats = response_cache.stats()
+    logger.info(f"HTTP кэш: попаданий {http_stats['hits']}, 304 {http_stats['revalidated']}, "
+                f"промахов {http_stats['misses']}")
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+GRAPHQL_HISTORY_QUERY = """
+query($owner: String!, $name: String!, $since: GitTimestamp, $until: GitTimestamp, $emails: [String!], $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef {
+      target {
+        ... on Commit {
+          history(first: 100, since: $since, until: $until, author: {emails: $emails}, after: $cursor) {
+            pageInfo { hasNextPage endCursor }
+            nodes { oid author { email date } }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+BLOB_OID_RE = re.compile(r'^[0-9a-f]{40}$')
+
+def github_graphql(query: str, variables: Dict, headers: Dict) -> Dict:
+    for attempt in range(Config.GITHUB_MAX_RETRIES + 1):
+        token = rate_governor.acquire('graphql')
+        response = get_session().post(GRAPHQL_URL, json={"query": query, "variables": variables},
+                                      headers=_with_token(headers, token, "bearer"), timeout=30)
+        if not rate_governor.update(response, token=token, resource='graphql') or attempt == Config.GITHUB_MAX_RETRIES:
+            break
+        response.close()
+
+    response.raise_for_status()
+    payload = response.json()
+    if payload.get('errors'):
+        messages = "; ".join(error.get('message', '') for error in payload['errors'])
+        if not payload.get('data'):
+            raise RuntimeError(f"Ошибка GraphQL запроса: {messages}")
+        logger.warning(f"GraphQL запрос выполнен с ошибками: {messages}")
+    return payload['data']
+
+def iter_graphql_commits(owner: str, repo: str, start_date: str, end_date: str, author_email: Union[str, Iterable[str]],
+                         headers: Dict) -> Iterator[Dict]:
+    variables = {
+        "owner": owner,
+        "name": repo,
+        "since": f"{start_date}T00:00:00Z",
+        "until": f"{end_date}T00:00:00Z",
+        "emails": author_emails(author_email),
+        "cursor": None
+    }
+    page = 1
+    while True:
+        data = github_graphql(GRAPHQL_HISTORY_QUERY, variables, headers)
+        branch = (data.get('repository') or {}).get('defaultBranchRef')
+        if not branch:
+            return
+        history = branch['target']['history']
+        logger.debug(f"Получена GraphQL страница коммитов {page}: {len(history['nodes'])} шт.")
+        yield from history['nodes']
+
+        if not history['pageInfo']['hasNextPage']:
+            return
+        variables["cursor"] = history['pageInfo']['endCursor']
+        page += 1
+
+def _fetch_blob_texts(owner: str, repo: str, blob_files: List[Dict], headers: Dict) -> Dict[str, Optional[str]]:
+    oids = list(dict.fromkeys(f['sha'] for f in blob_files if f['sha'] and BLOB_OID_RE.match(f['sha'])))
+    texts = {}
+    if oids:
+        aliases = " ".join(
+            f'b{n}: object(oid: "{oid}") {{ ... on Blob {{ text byteSize isBinary isTruncated }} }}'
+            for n, oid in enumerate(oids)
+        )
+        query = f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {aliases} }} }}"
+        try:
+            repository = github_graphql(query, {"owner": owner, "name": repo}, headers).get('repository') or {}
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            logger.error(f"Ошибка пакетного получения блобов через GraphQL: {e}")
+            repository = {}
+
+        for n, oid in enumerate(oids):
+            blob = repository.get(f"b{n}")
+            if not blob or blob.get('isTruncated'):
                 continue
-                
-            data = files_response.json()
-            if not isinstance(data, dict):
+            if blob.get('isBinary') or blob.get('text') is None:
+                texts[oid] = None
+            elif blob.get('byteSize', 0) > Config.GITHUB_MAX_BLOB_BYTES:
+                logger.warning(f"Блоб {oid} больше {Config.GITHUB_MAX_BLOB_BYTES} байт, пропускаем")
+                texts[oid] = None
+            else:
+                texts[oid] = blob['text']
+                blob_cache.put(oid, blob['text'])
+
+    contents = {}
+    for blob_file in blob_files:
+        if blob_file['sha'] in texts:
+            contents[blob_file['sha']] = texts[blob_file['sha']]
+        else:
+            contents[blob_file['sha']] = _fetch_file_content(owner, repo, blob_file['filename'], blob_file['sha'],
+                                                             blob_file['raw_url'], headers)
+    return contents
+
+def iter_graphql_files(repo_url: str, start_date: str, end_date: str, author_email: Union[str, Iterable[str]],
+                       mode: str = 'full') -> Iterator[Dict]:
+    parts = repo_url.replace("https://github.com/", "").split("/")
+    owner, repo = parts[0], parts[1]
+    emails = author_emails(author_email)
+    if not Config.GITHUB_TOKENS:
+        raise ValueError("GraphQL API GitHub требует GITHUB_TOKEN или GITHUB_TOKENS")
+
+    headers = {
+        "Accept": "application/vnd.github.v3+json"
+    }
+    content_type = 'diff' if mode == 'diff' else 'file'
+
+    with ThreadPoolExecutor(max_workers=Config.GITHUB_MAX_WORKERS) as executor:
+        commit_futures = deque()
+        windows = deque()
+        window = []
+        window_blobs = {}
+
+        def close_window():
+            nonlocal window, window_blobs
+            if window:
+                blobs = executor.submit(_fetch_blob_texts, owner, repo, list(window_blobs.values()), headers) \
+                    if window_blobs else None
+                windows.append((window, blobs))
+            window, window_blobs = [], {}
+
+        def schedule_windows(block: bool):
+            while commit_futures and (block or commit_futures[0][3].done()):
+                commit_sha, commit_date, commit_email, future = commit_futures.popleft()
+                for commit_file in future.result():
+                    if mode == 'diff':
+                        if commit_file['patch']:
+                            window.append((commit_file, commit_sha, commit_date, commit_email, commit_file['patch']))
+                        continue
+                    cached_content = blob_cache.get(commit_file['sha'])
+                    window.append((commit_file, commit_sha, commit_date, commit_email, cached_content))
+                    if cached_content is None:
+                        window_blobs[commit_file['sha']] = commit_file
+                        if len(window_blobs) >= Config.GITHUB_GRAPHQL_BLOB_BATCH:
+                            close_window()
+                if not window_blobs:
+                    close_window()
+            if block:
+                close_window()
+
+        def ready_files(block: bool) -> Iterator[Dict]:
+            while windows:
+                entries, blobs = windows[0]
+                if not block and blobs is not None and not blobs.done():
+                    return
+                windows.popleft()
+                contents = blobs.result() if blobs is not None else {}
+                for commit_file, commit_sha, commit_date, commit_email, content in entries:
+                    if content is None:
+                        content = contents.get(commit_file['sha'])
+                    if content is None:
+                        continue
+                    yield {
+                        'filename': commit_file['filename'],
+                        'commit_sha': commit_sha,
+                        'commit_date': commit_date,
+                        'author_email': commit_email,
+                        'content_type': content_type,
+                        'code': content
+                    }
+
+        commits = 0
+        for commit in iter_graphql_commits(owner, repo, start_date, end_date, emails, headers):
+            author_info = commit.get('author') or {}
+            if author_info.get('email') not in emails:
                 continue
-                
-            for file in data.get('files', []):
-                filename = file.get('filename', '')
-                if not filename:
-                    continue
-                    
-                if not any(filename.endswith(ext) for ext in Config.ALLOWED_EXTENSIONS):
-                    continue
-                    
-                content_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{filename}?ref={commit_sha}"
-                content_response = requests.get(content_url, headers=headers, timeout=10)
-                
-                if content_response.status_code != 200:
-                    continue
-                    
-                content = content_response.json().get('content', '')
-                if not content:
-                    continue
-                    
-                try:
-                    decoded_content = base64.b64decode(content).decode('utf-8', errors='ignore')
-                except Exception:
-                    decoded_content = "Ошибка декодирования содержимого"
-                
-                files_data.append({
-                    'filename': filename,
-                    'commit_date': commit_date,
-                    'author_email': author_email,
-                    'code': decoded_content
-                })
-        
-        return files_data
-        
-    except Exception as e:
-        logger.error(f"Ошибка получения файлов: {str(e)}")
-        return []
\ No newline at end of file
+            commits += 1
+            commit_futures.append((
+                commit['oid'],
+                author_info.get('date'),
+                author_info['email'],
+                executor.submit(_fetch_commit_files, owner, repo, commit['oid'], headers)
+            ))
+            schedule_windows(block=False)
+            yield from ready_files(block=False)
+
+        schedule_windows(block=True)
+        yield from ready_files(block=True)
+
+    logger.info(f"GraphQL: обработано коммитов {commits}")
+
+REPOSITORY_BACKENDS = {
+    'rest': iter_github_files,
+    'graphql': iter_graphql_files,
+}
+
+def iter_repository_files(repo_url: str, start_date: str, end_date: str, author_email: Union[str, Iterable[str]],
+                          mode: str = 'full') -> Iterator[Dict]:
+    if Config.GITHUB_BACKEND == 'git':
+        from git_backend import iter_git_files
+        return iter_git_files(repo_url, start_date, end_date, author_email, mode)
+    backend = REPOSITORY_BACKENDS.get(Config.GITHUB_BACKEND)
+    if backend is None:
+        raise ValueError(f"Неизвестный бэкенд репозиториев: {Config.GITHUB_BACKEND}")
+    return backend(repo_url, start_date, end_date, author_email, mode)
@@ -0,0 +1,135 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+import requests
+from requests.structures import CaseInsensitiveDict
+from typing import Optional, Dict
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    def __init__(self, url: str, etag: Optional[str], link: Optional[str], body: bytes, immutable: bool):
+        self.url = url
+        self.etag = etag
+        self.link = link
+        self.body = body
+        self.immutable = immutable
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.encoding = 'utf-8'
+        response._content = self.body
+        headers = {'Content-Type': 'application/json; charset=utf-8', 'X-Local-Cache': 'HIT'}
+        if self.etag:
+            headers['ETag'] = self.etag
+        if self.link:
+            headers['Link'] = self.link
+        response.headers = CaseInsensitiveDict(headers)
+        return response
+
+
+class ResponseCache:
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " etag TEXT,"
+                " link TEXT,"
+                " body BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " immutable INTEGER NOT NULL DEFAULT 0,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed ON responses (accessed_at)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict] = None, accept: Optional[str] = None) -> str:
+        prepared = requests.Request('GET', url, params=params).prepare()
+        return f"{accept or ''} {prepared.url}"
+
+    def get(self, key: str, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT etag, link, body, immutable FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        return CachedResponse(url, row[0], row[1], row[2], bool(row[3]))
+
+    def record_hit(self, revalidated: bool = False):
+        with self._lock:
+            if revalidated:
+                self.revalidated += 1
+            else:
+                self.hits += 1
+
+    def put(self, key: str, response: requests.Response, immutable: bool = False):
+        body = response.content
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, link, body, size, immutable, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response.headers.get('ETag'), response.headers.get('Link'), body, size,
+                 int(immutable), time.time())
+            )
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = 0
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+            evicted += 1
+        logger.info(f"HTTP кэш: удалено {evicted} записей, размер {self._total_bytes} байт")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+response_cache = ResponseCache(Config.HTTP_CACHE_PATH, Config.HTTP_CACHE_MAX_BYTES)
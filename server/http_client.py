@@ -0,0 +1,48 @@
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        connect=Config.HTTP_MAX_RETRIES,
+        read=Config.HTTP_MAX_RETRIES,
+        backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=Config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=Config.HTTP_POOL_SIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'User-Agent': 'GitHub-Report-Generator'
+    })
+    logger.info(f"HTTP сессия создана: пул {Config.HTTP_POOL_SIZE}, повторов {Config.HTTP_MAX_RETRIES}")
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
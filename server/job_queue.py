@@ -0,0 +1,235 @@
+import os
+import json
+import socket
+import logging
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import or_
+from models import db, Job, Report, BatchReport
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_JOB_STATUSES = ('queued', 'running')
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def make_worker_id(suffix: str = '') -> str:
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    return f"{worker_id}:{suffix}" if suffix else worker_id
+
+
+def enqueue_job(kind: str, payload: dict, report_id: str = None, priority: int = None,
+                max_attempts: int = None, commit: bool = True) -> Job:
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload, ensure_ascii=False),
+        status='queued',
+        priority=Config.JOB_DEFAULT_PRIORITY if priority is None else priority,
+        max_attempts=max_attempts or Config.JOB_MAX_ATTEMPTS,
+        report_id=report_id
+    )
+    db.session.add(job)
+    db.session.flush()
+    if commit:
+        db.session.commit()
+    logger.info(f"Job {job.id} ({kind}) queued for report {report_id} with priority {job.priority}")
+    return job
+
+
+def claim_next_job(worker_id: str) -> Job | None:
+    now = _utcnow()
+    candidates = Job.query.filter(
+        Job.status == 'queued',
+        or_(Job.run_after.is_(None), Job.run_after <= now)
+    ).order_by(Job.priority.desc(), Job.created_at, Job.id).limit(5).all()
+
+    for candidate in candidates:
+        claimed = Job.query.filter_by(id=candidate.id, status='queued').update({
+            'status': 'running',
+            'locked_by': worker_id,
+            'locked_at': now,
+            'attempts': Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            db.session.expire_all()
+            return db.session.get(Job, candidate.id)
+    return None
+
+
+def find_inflight_leader(dedup_key: str) -> Report | None:
+    return Report.query.join(Job, Job.report_id == Report.id).filter(
+        Report.dedup_key == dedup_key,
+        Report.leader_id.is_(None),
+        Report.status == 'processing',
+        Job.status.in_(ACTIVE_JOB_STATUSES)
+    ).order_by(Report.created_at).first()
+
+
+def _copy_leader_state(leader: Report, follower: Report):
+    follower.status = leader.status
+    follower.llm_status = leader.llm_status
+    follower.pdf_report_path = leader.pdf_report_path
+
+
+def sync_followers(report_id: str):
+    leader = db.session.get(Report, report_id)
+    if not leader:
+        return
+    followers = Report.query.filter_by(leader_id=report_id).all()
+    for follower in followers:
+        _copy_leader_state(leader, follower)
+    if followers:
+        logger.info(f"Report {report_id} state '{leader.status}' propagated to {len(followers)} attached report(s)")
+
+
+def settle_follower(follower: Report):
+    leader_active = db.session.query(Job.id).filter(
+        Job.report_id == follower.leader_id,
+        Job.status.in_(ACTIVE_JOB_STATUSES)
+    ).first()
+    if leader_active:
+        return
+    leader = db.session.get(Report, follower.leader_id)
+    if not leader:
+        return
+    db.session.refresh(leader)
+    _copy_leader_state(leader, follower)
+    db.session.commit()
+    logger.info(f"Report {follower.id} attached after report {leader.id} finished, copied state '{leader.status}'")
+
+
+def complete_job(job_id: int):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return
+    job.status = 'done'
+    job.locked_by = None
+    job.last_error = None
+    if job.report_id:
+        sync_followers(job.report_id)
+    db.session.commit()
+    logger.info(f"Job {job_id} completed after {job.attempts} attempt(s)")
+
+
+def fail_job(job_id: int, error: str):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return
+    job.last_error = error[:2000]
+    job.locked_by = None
+    if job.attempts < job.max_attempts:
+        delay = Config.JOB_RETRY_BASE_DELAY * (2 ** (job.attempts - 1))
+        job.status = 'queued'
+        job.run_after = _utcnow() + timedelta(seconds=delay)
+        if job.report_id:
+            report = db.session.get(Report, job.report_id)
+            if report:
+                report.status = 'processing'
+                report.llm_status = 'pending'
+        elif job.kind == 'batch_report':
+            batch = db.session.get(BatchReport, job.get_payload().get('batch_id'))
+            if batch:
+                batch.status = 'processing'
+        logger.warning(f"Job {job_id} failed (attempt {job.attempts}/{job.max_attempts}), retry in {delay}s: {error}")
+    else:
+        job.status = 'failed'
+        logger.error(f"Job {job_id} failed permanently after {job.attempts} attempt(s): {error}")
+    if job.report_id:
+        sync_followers(job.report_id)
+    db.session.commit()
+
+
+def _worker_is_dead(locked_by: str | None, locked_at: datetime | None) -> bool:
+    if not locked_by:
+        return True
+    if locked_at is not None:
+        if locked_at.tzinfo is None:
+            locked_at = locked_at.replace(tzinfo=timezone.utc)
+        if _utcnow() - locked_at > timedelta(seconds=Config.JOB_STALE_TIMEOUT):
+            return True
+
+    parts = locked_by.split(':')
+    if len(parts) < 2 or parts[0] != socket.gethostname():
+        return False
+    try:
+        return not _pid_alive(int(parts[1]))
+    except ValueError:
+        return True
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_jobs() -> int:
+    recovered = 0
+    for job in Job.query.filter_by(status='running').all():
+        if _worker_is_dead(job.locked_by, job.locked_at):
+            logger.warning(f"Requeueing job {job.id} abandoned by worker {job.locked_by}")
+            job.status = 'queued'
+            job.locked_by = None
+            job.run_after = None
+            recovered += 1
+
+    active_report_ids = {
+        report_id for (report_id,) in db.session.query(Job.report_id).filter(
+            Job.status.in_(ACTIVE_JOB_STATUSES), Job.report_id.isnot(None)
+        )
+    }
+    for report in Report.query.filter_by(status='processing').all():
+        if report.id in active_report_ids:
+            continue
+        if report.leader_id:
+            leader = db.session.get(Report, report.leader_id)
+            if leader and leader.status == 'processing':
+                continue
+            if leader:
+                _copy_leader_state(leader, report)
+                continue
+            report.leader_id = None
+            report.report_dir_path = os.path.join(Config.REPORT_DIR, report.id)
+            os.makedirs(report.report_dir_path, exist_ok=True)
+        logger.warning(f"Report {report.id} was left in 'processing' without a job, requeueing")
+        report.llm_status = 'pending'
+        enqueue_job('report', report_job_payload(report), report_id=report.id, commit=False)
+        recovered += 1
+
+    db.session.commit()
+    return recovered
+
+
+def report_job_payload(report: Report) -> dict:
+    return {
+        'report_id': report.id,
+        'github_url': report.github_url,
+        'date_range': report.date_range,
+        'email': report.email,
+        'user_id': report.user_id,
+        'analysis_mode': report.analysis_mode
+    }
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Optional, Dict, List
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResultCache:
+    def __init__(self, db_path: str, ttl_seconds: int, max_entries: int):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " text TEXT NOT NULL,"
+                " status TEXT,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_completions_accessed ON completions (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, prompt_version: int, messages: List[Dict]) -> str:
+        payload = json.dumps({
+            'model': model,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'prompt_version': prompt_version,
+            'messages': messages
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT text, status, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and now - row[2] > self.ttl_seconds):
+                if row is not None:
+                    conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+        return {'text': row[0], 'status': row[1]}
+
+    def put(self, key: str, model: str, text: str, status: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, text, status, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, text, status, now, now)
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+llm_cache = LLMResultCache(
+    Config.LLM_CACHE_PATH,
+    ttl_seconds=Config.LLM_CACHE_TTL_DAYS * 24 * 3600,
+    max_entries=Config.LLM_CACHE_MAX_ENTRIES
+)
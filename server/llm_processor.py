@@ -1,29 +1,105 @@
 from __future__ import annotations
 from yandex_cloud_ml_sdk import YCloudML
-import json
 from datetime import datetime
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import requests
-from io import BytesIO
 from collections import defaultdict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from code_chunker import split_code, estimate_tokens
+from http_client import get_session
+from llm_cache import llm_cache
 import logging
 import os
+import re
+import copy
+import threading
+from typing import Iterable
 
 logger = logging.getLogger(__name__)
 
+LLM_MODEL = "yandexgpt"
+PROMPT_VERSION = 2
+ANALYSIS_TEMPERATURE = 0.2
+ANALYSIS_MAX_TOKENS = 1500
+
+ANALYSIS_SYSTEM_PROMPT = (
+    "Ты - опытный разработчик. Проанализируй код по критериям:\n"
+    "1. Качество кода\n2. Потенциальные проблемы\n3. Возможности улучшения\n\n"
+    "Определи статус файла по следующим правилам:\n"
+    "- [STATUS: COMPLETED] - если код полностью готов и соответствует стандартам:\n"
+    "  * Реализует всю заявленную функциональность\n"
+    "  * Имеет базовую обработку ошибок\n"
+    "  * Соответствует стилевым стандартам\n"
+    "  * Доработки носят рекомендательный характер\n\n"
+    "- [STATUS: PARTIAL] - если код в основном готов, но требует доработок:\n"
+    "  * Реализована основная функциональность\n"
+    "  * Есть небольшие недочеты\n"
+    "  * Требуются незначительные улучшения\n\n"
+    "- [STATUS: INCOMPLETE] - если код требует серьезных доработок:\n"
+    "  * Есть явные недоработки (TODO, незавершенные методы)\n"
+    "  * Критические ошибки в логике\n"
+    "  * Отсутствует обработка ошибок\n\n"
+    "В начале ответа укажи статус файла в формате: [STATUS: COMPLETED], [STATUS: PARTIAL] или [STATUS: INCOMPLETE]\n"
+    "Затем дай развернутый анализ."
+)
+
+BATCH_SYSTEM_PROMPT = (
+    ANALYSIS_SYSTEM_PROMPT +
+    "\n\nТебе передано несколько файлов, каждый начинается строкой '### FILE <номер>: <имя>'.\n"
+    "Проанализируй каждый файл отдельно. Для каждого файла начни раздел ответа строкой "
+    "'### FILE <номер>: <имя>', а следующей строкой укажи статус файла в формате [STATUS: ...].\n"
+    "Не пропускай файлы и не объединяй их разделы."
+)
+BATCH_SECTION_RE = re.compile(r'^\s*#{2,}\s*FILE\s+(\d+)\b[^\n]*$', re.MULTILINE)
+
+CHUNK_REDUCE_SYSTEM_PROMPT = (
+    "Ты - опытный разработчик. Тебе даны анализы последовательных фрагментов одного файла.\n"
+    "Сведи их в единый анализ файла по критериям: качество кода, потенциальные проблемы, возможности улучшения.\n"
+    "Статус всего файла определи по тем же правилам, что и для фрагментов: "
+    "[STATUS: COMPLETED], [STATUS: PARTIAL] или [STATUS: INCOMPLETE].\n"
+    "В начале ответа укажи статус файла, затем дай сводный анализ без повторов."
+)
+
+DIGEST_SYSTEM_PROMPT = (
+    "Ты - технический лидер. Тебе даны краткие анализы нескольких файлов.\n"
+    "Сожми их в компактный обзор, сохранив имена файлов, авторов, статусы, конкретные проблемы, "
+    "антипаттерны и положительные моменты с примерами. Не добавляй общих фраз."
+)
+
+
+AUTHOR_STATS_HEADER = ["Автор", "Файлов", "Изменений в коммитах", "Завершено", "Частично",
+                       "Не завершено/Ошибки", "Процент выполнения"]
+
+FONT_FILES = {
+    'Roboto': ('Roboto-Regular.ttf', 'https://github.com/googlefonts/roboto/blob/main/src/hinted/Roboto-Regular.ttf?raw=true'),
+    'Roboto-Bold': ('Roboto-Bold.ttf', 'https://github.com/googlefonts/roboto/blob/main/src/hinted/Roboto-Bold.ttf?raw=true')
+}
+SYSTEM_FONT_FALLBACKS = [
+    ('DejaVuSans', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+     'DejaVuSans-Bold', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('DejaVuSans', '/usr/share/fonts/dejavu-sans-fonts/DejaVuSans.ttf',
+     'DejaVuSans-Bold', '/usr/share/fonts/dejavu-sans-fonts/DejaVuSans-Bold.ttf'),
+]
+
 
 class PDFGenerator:
+    _font_lock = threading.Lock()
+    _fonts = None
+
     @staticmethod
     def _download_font(font_url):
         try:
-            response = requests.get(font_url, timeout=10)
+            response = get_session().get(font_url, timeout=10)
             response.raise_for_status()
-            return BytesIO(response.content)
+            return response.content
         except requests.exceptions.RequestException as e:
             logger.error(f"Ошибка загрузки шрифта {font_url}: {e}")
             return None
@@ -32,82 +108,172 @@ class PDFGenerator:
             return None
 
     @staticmethod
-    def save_to_pdf(filename: str, title: str, content: str):
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    def _font_file(file_name: str, font_url: str) -> str | None:
+        path = os.path.join(Config.FONT_DIR, file_name)
+        if os.path.exists(path):
+            return path
+        if not Config.FONT_DOWNLOAD_ENABLED:
+            logger.warning(f"Шрифт {file_name} не найден в {Config.FONT_DIR}, загрузка отключена.")
+            return None
 
-        font_urls = {
-            'Roboto': 'https://github.com/googlefonts/roboto/blob/main/src/hinted/Roboto-Regular.ttf?raw=true',
-            'Roboto-Bold': 'https://github.com/googlefonts/roboto/blob/main/src/hinted/Roboto-Bold.ttf?raw=true'
-        }
+        font_data = PDFGenerator._download_font(font_url)
+        if not font_data:
+            return None
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(Config.FONT_DIR, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(font_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить шрифт {file_name} в {Config.FONT_DIR}: {e}")
+            return None
+        logger.info(f"Шрифт {file_name} загружен и сохранен в {path}")
+        return path
 
+    @staticmethod
+    def _register_fonts() -> tuple[str, str]:
         registered_fonts = pdfmetrics.getRegisteredFontNames()
-        fonts_to_register = {}
+        for name, (file_name, url) in FONT_FILES.items():
+            if name in registered_fonts:
+                continue
+            path = PDFGenerator._font_file(file_name, url)
+            if not path:
+                logger.warning(f"Не удалось загрузить данные для шрифта {name}.")
+                continue
+            try:
+                pdfmetrics.registerFont(TTFont(name, path))
+                logger.info(f"Шрифт {name} успешно зарегистрирован.")
+            except Exception as e:
+                logger.error(f"Не удалось зарегистрировать шрифт {name}: {e}")
 
-        for name, url in font_urls.items():
-            if name not in registered_fonts:
-                fonts_to_register[name] = url
+        registered_fonts = pdfmetrics.getRegisteredFontNames()
+        if all(name in registered_fonts for name in FONT_FILES):
+            return 'Roboto', 'Roboto-Bold'
 
-        for name, url in fonts_to_register.items():
+        for font_name, font_path, bold_font_name, bold_font_path in SYSTEM_FONT_FALLBACKS:
+            if not (os.path.exists(font_path) and os.path.exists(bold_font_path)):
+                continue
             try:
-                font_data = PDFGenerator._download_font(url)
-                if font_data:
-                    pdfmetrics.registerFont(TTFont(name, font_data))
-                    logger.info(f"Шрифт {name} успешно зарегистрирован.")
-                else:
-                    logger.warning(f"Не удалось загрузить данные для шрифта {name}.")
+                pdfmetrics.registerFont(TTFont(font_name, font_path))
+                pdfmetrics.registerFont(TTFont(bold_font_name, bold_font_path))
             except Exception as e:
-                logger.error(f"Не удалось зарегистрировать шрифт {name}: {e}")
+                logger.error(f"Не удалось зарегистрировать системный шрифт {font_name}: {e}")
+                continue
+            logger.warning(f"Шрифт Roboto недоступен. Используем системный шрифт {font_name}.")
+            return font_name, bold_font_name
 
-        if 'Roboto' in pdfmetrics.getRegisteredFontNames():
-            font_name = 'Roboto'
-            bold_font_name = 'Roboto-Bold'
-        else:
-            logger.warning("Шрифт Roboto недоступен. Используем стандартный шрифт (возможны проблемы с кириллицей).")
-            font_name = 'Helvetica'
-            bold_font_name = 'Helvetica-Bold'
+        logger.warning("Шрифт Roboto недоступен. Используем стандартный шрифт (возможны проблемы с кириллицей).")
+        return 'Helvetica', 'Helvetica-Bold'
 
+    @staticmethod
+    def preload_fonts() -> tuple[str, str]:
+        with PDFGenerator._font_lock:
+            if PDFGenerator._fonts is None:
+                PDFGenerator._fonts = PDFGenerator._register_fonts()
+            return PDFGenerator._fonts
 
-        doc = SimpleDocTemplate(filename, pagesize=letter)
+    @staticmethod
+    def save_to_pdf(filename: str, title: str, content: str, tables: list | None = None):
+        get_pdf_renderer().render(filename, title, content, tables)
+
+
+class PDFRenderer:
+    HEADING_RE = re.compile(r'^(?:={3,}\s*(.+?)\s*={3,}|#{1,4}\s+(.+))$')
+    BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+    CLEAN_TABLE = str.maketrans('', '', '\x00\ufffd\r')
+
+    def __init__(self):
+        self.font_name, self.bold_font_name = PDFGenerator.preload_fonts()
         styles = getSampleStyleSheet()
 
-        title_style = ParagraphStyle(
+        self.title_style = ParagraphStyle(
             'Title',
             parent=styles['Heading1'],
-            fontName=bold_font_name,
+            fontName=self.bold_font_name,
             fontSize=14,
             alignment=1,
             spaceAfter=20,
             textColor=colors.darkblue
         )
-
-        text_style = ParagraphStyle(
+        self.heading_style = ParagraphStyle(
+            'Heading',
+            parent=styles['Heading2'],
+            fontName=self.bold_font_name,
+            fontSize=12,
+            spaceBefore=10,
+            spaceAfter=8,
+            textColor=colors.darkblue
+        )
+        self.text_style = ParagraphStyle(
             'Text',
             parent=styles['BodyText'],
-            fontName=font_name,
+            fontName=self.font_name,
             fontSize=10,
             leading=14,
             spaceAfter=12
         )
+        self.cell_style = ParagraphStyle(
+            'Cell',
+            parent=self.text_style,
+            fontSize=9,
+            leading=11,
+            spaceAfter=0
+        )
+        self.header_cell_style = ParagraphStyle(
+            'HeaderCell',
+            parent=self.cell_style,
+            fontName=self.bold_font_name,
+            textColor=colors.white
+        )
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke]),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ])
+
+    def _markup(self, text: str) -> str:
+        return self.BOLD_RE.sub(r'<b>\1</b>', escape(text)).replace('\n', '<br/>')
 
+    def _paragraph(self, text: str) -> Paragraph:
+        try:
+            return Paragraph(self._markup(text), self.text_style)
+        except Exception as para_err:
+            logger.error(f"Ошибка добавления параграфа в PDF: {para_err}. Параграф: '{text[:100]}...'")
+            return Paragraph(escape(text).replace('\n', '<br/>'), self.text_style)
+
+    def _content_flowables(self, content: str) -> list:
         story = []
-        story.append(Paragraph(title, title_style))
-        story.append(Spacer(1, 12))
-
-        def clean_text(text):
-            if not isinstance(text, str):
-                text = str(text)
-            return text.replace('\x00', '').replace('\ufffd', '').replace('\r', '')
-
-        for paragraph in content.split('\n\n'):
-            safe_paragraph = clean_text(paragraph)
-            if safe_paragraph.strip():
-                try:
-                    story.append(Paragraph(safe_paragraph, text_style))
-                    story.append(Spacer(1, 8))
-                except Exception as para_err:
-                    logger.error(f"Ошибка добавления параграфа в PDF: {para_err}. Параграф: '{safe_paragraph[:100]}...'")
-                    story.append(Paragraph(f"[Ошибка рендеринга параграфа: {para_err}]", text_style))
-                    story.append(Spacer(1, 8))
+        for block in str(content).translate(self.CLEAN_TABLE).split('\n\n'):
+            lines = block.strip('\n').split('\n')
+            heading = self.HEADING_RE.match(lines[0].strip())
+            if heading:
+                story.append(Paragraph(escape(heading.group(1) or heading.group(2)), self.heading_style))
+                lines = lines[1:]
+            body = '\n'.join(lines)
+            if body.strip():
+                story.append(self._paragraph(body))
+                story.append(Spacer(1, 8))
+        return story
+
+    def _table_flowables(self, width: float, title: str, header: list, rows: list) -> list:
+        first_width = width * 0.34
+        other_width = (width - first_width) / max(len(header) - 1, 1)
+        data = [[Paragraph(escape(str(cell)), self.header_cell_style) for cell in header]]
+        data.extend([Paragraph(escape(str(cell)), self.cell_style) for cell in row] for row in rows)
+        table = Table(data, colWidths=[first_width] + [other_width] * (len(header) - 1), repeatRows=1, hAlign='LEFT')
+        table.setStyle(self.table_style)
+        return [Paragraph(escape(title), self.heading_style), table, Spacer(1, 12)]
+
+    def render(self, filename: str, title: str, content: str, tables: list | None = None) -> int:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        doc = SimpleDocTemplate(filename, pagesize=letter)
+
+        story = [Paragraph(escape(title), self.title_style), Spacer(1, 12)]
+        story.extend(self._content_flowables(content))
+        for table_title, header, rows in tables or []:
+            story.extend(self._table_flowables(doc.width, table_title, header, rows))
 
         try:
             doc.build(story)
@@ -115,12 +281,29 @@ class PDFGenerator:
         except Exception as build_err:
              logger.error(f"Ошибка сборки PDF документа {filename}: {build_err}", exc_info=True)
              raise
+        return doc.page
+
+
+_pdf_renderer = None
+_pdf_renderer_lock = threading.Lock()
+
+
+def get_pdf_renderer() -> PDFRenderer:
+    global _pdf_renderer
+    if _pdf_renderer is None:
+        with _pdf_renderer_lock:
+            if _pdf_renderer is None:
+                _pdf_renderer = PDFRenderer()
+    return _pdf_renderer
 
 
 class CodeAnalyzer:
-    def __init__(self, folder_id: str, auth_token: str):
+    def __init__(self, folder_id: str, auth_token: str, max_workers: int | None = None, request_timeout: float | None = None):
         if not folder_id or not auth_token:
             raise ValueError("Yandex Folder ID and Auth Token are required.")
+        self.max_workers = max_workers or Config.LLM_MAX_WORKERS
+        self.batching = Config.LLM_BATCH_ENABLED
+        self.request_timeout = request_timeout or Config.LLM_REQUEST_TIMEOUT
         try:
             self.sdk = YCloudML(
                 folder_id=folder_id,
@@ -135,65 +318,142 @@ class CodeAnalyzer:
         self.summaries = []
         self.authors_stats = defaultdict(list)
         self.total_files = 0
+        self.total_commits = 0
         self.completed_files = 0
         self.partial_files = 0
         self.incomplete_files = 0
+        self.general_analysis_text = None
 
-    def analyze_code(self, code, filename, author_email):
-        MAX_CODE_LEN = 5500
-        truncated_code = code[:MAX_CODE_LEN]
-        if len(code) > MAX_CODE_LEN:
-             logger.warning(f"Код файла {filename} обрезан до {MAX_CODE_LEN} символов для анализа.")
+    def for_new_report(self) -> 'CodeAnalyzer':
+        analyzer = copy.copy(self)
+        analyzer._reset_stats()
+        return analyzer
 
-        messages = [
+    @staticmethod
+    def _parse_status(raw_text: str) -> tuple[str, str]:
+        status = "INCOMPLETE"
+        text_upper = raw_text.upper()
+        if text_upper.startswith("[STATUS: COMPLETED]"):
+             status = "COMPLETED"
+        elif text_upper.startswith("[STATUS: PARTIAL]"):
+             status = "PARTIAL"
+
+        summary_text = raw_text
+        if summary_text.startswith("[STATUS:"):
+            end_bracket_index = summary_text.find("]")
+            if end_bracket_index != -1:
+                summary_text = summary_text[end_bracket_index+1:].strip()
+        return status, summary_text
+
+    def _complete(self, messages: list, temperature: float, max_tokens: int, parse_status: bool = False,
+                  use_cache: bool = True) -> str | None:
+        cache_key = llm_cache.make_key(LLM_MODEL, temperature, max_tokens, PROMPT_VERSION, messages)
+        if use_cache:
+            cached = llm_cache.get(cache_key)
+            if cached:
+                logger.debug(f"Результат LLM взят из кэша ({cache_key[:12]})")
+                return cached['text']
+
+        result = self.sdk.models.completions(LLM_MODEL).configure(
+            temperature=temperature, max_tokens=max_tokens
+        ).run(messages, timeout=self.request_timeout)
+        if not result or not result[0]:
+            return None
+
+        text = result[0].text
+        if text and use_cache:
+            status = self._parse_status(text)[0] if parse_status else None
+            llm_cache.put(cache_key, LLM_MODEL, text, status)
+        return text
+
+    @staticmethod
+    def _analysis_messages(code: str, filename: str, content_type: str = 'file', part=None) -> list:
+        max_chars = Config.LLM_CHUNK_MAX_TOKENS * 3
+        if estimate_tokens(code) > Config.LLM_CHUNK_MAX_TOKENS:
+             code = code[:max_chars]
+             logger.warning(f"Код файла {filename} обрезан до {max_chars} символов для анализа.")
+
+        subject = f"фрагмент {part[0]}/{part[1]} файла {filename}" if part else filename
+        if content_type == 'diff':
+            user_text = (f"Проанализируй изменения автора в {subject} (unified diff, "
+                         f"строки с '+' добавлены, с '-' удалены):\n\n{code}")
+        else:
+            user_text = f"Проанализируй код из {subject}:\n\n{code}"
+
+        return [
             {
                 "role": "system",
-                "text": "Ты - опытный разработчик. Проанализируй код по критериям:\n"
-                        "1. Качество кода\n2. Потенциальные проблемы\n3. Возможности улучшения\n\n"
-                        "Определи статус файла по следующим правилам:\n"
-                        "- [STATUS: COMPLETED] - если код полностью готов и соответствует стандартам:\n"
-                        "  * Реализует всю заявленную функциональность\n"
-                        "  * Имеет базовую обработку ошибок\n"
-                        "  * Соответствует стилевым стандартам\n"
-                        "  * Доработки носят рекомендательный характер\n\n"
-                        "- [STATUS: PARTIAL] - если код в основном готов, но требует доработок:\n"
-                        "  * Реализована основная функциональность\n"
-                        "  * Есть небольшие недочеты\n"
-                        "  * Требуются незначительные улучшения\n\n"
-                        "- [STATUS: INCOMPLETE] - если код требует серьезных доработок:\n"
-                        "  * Есть явные недоработки (TODO, незавершенные методы)\n"
-                        "  * Критические ошибки в логике\n"
-                        "  * Отсутствует обработка ошибок\n\n"
-                        "В начале ответа укажи статус файла в формате: [STATUS: COMPLETED], [STATUS: PARTIAL] или [STATUS: INCOMPLETE]\n"
-                        "Затем дай развернутый анализ."
+                "text": ANALYSIS_SYSTEM_PROMPT
             },
             {
                 "role": "user",
-                "text": f"Проанализируй код из {filename}:\n\n{code[:3000]}"
+                "text": user_text
             }
         ]
 
+    @classmethod
+    def _analysis_cache_key(cls, file_data: dict) -> str:
+        messages = cls._analysis_messages(file_data['code'], file_data['filename'], file_data.get('content_type', 'file'))
+        return llm_cache.make_key(LLM_MODEL, ANALYSIS_TEMPERATURE, ANALYSIS_MAX_TOKENS, PROMPT_VERSION, messages)
+
+    def analyze_code(self, code, filename, author_email, content_type='file', part=None):
+        messages = self._analysis_messages(code, filename, content_type, part)
+
         try:
-            result = self.sdk.models.completions("yandexgpt").configure(temperature=0.2, max_tokens=1500).run(messages)
+            result = self._complete(messages, temperature=ANALYSIS_TEMPERATURE, max_tokens=ANALYSIS_MAX_TOKENS,
+                                    parse_status=True)
             logger.info(f"Анализ файла {filename} завершен.")
             return result
         except Exception as e:
             logger.error(f"Ошибка вызова YandexGPT API для файла {filename}: {e}", exc_info=True)
-            return []
+            return None
+
+    def _digest_summaries(self, group_text: str) -> str:
+        messages = [
+            {"role": "system", "text": DIGEST_SYSTEM_PROMPT},
+            {"role": "user", "text": group_text}
+        ]
+        try:
+            digest = self._complete(messages, temperature=0.2, max_tokens=Config.LLM_DIGEST_MAX_TOKENS)
+        except Exception as e:
+            logger.error(f"Ошибка сжатия анализов для общего отчета: {e}", exc_info=True)
+            digest = None
+        if not digest:
+            return group_text[:Config.LLM_DIGEST_MAX_TOKENS * 3]
+        return digest + "\n---"
+
+    def _reduce_summaries(self, blocks: list) -> str:
+        level = 0
+        while True:
+            combined = "\n".join(blocks)
+            if estimate_tokens(combined) <= Config.LLM_SUMMARY_MAX_TOKENS or len(blocks) <= 1:
+                return combined
+
+            groups = []
+            current = []
+            for block in blocks:
+                if current and estimate_tokens("\n".join(current + [block])) > Config.LLM_SUMMARY_MAX_TOKENS:
+                    groups.append("\n".join(current))
+                    current = []
+                current.append(block)
+            if current:
+                groups.append("\n".join(current))
+
+            level += 1
+            logger.info(f"Иерархическое сжатие анализов, уровень {level}: {len(blocks)} блоков -> {len(groups)} групп")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                blocks = list(executor.map(self._digest_summaries, groups))
 
     def make_general_analysis(self):
         if not self.summaries:
             logger.warning("Нет данных для общего анализа.")
             return "Нет данных для общего анализа."
 
-        MAX_SUMMARY_LEN = 5500
-        combined_summary = "\n".join([
-            f"Файл: {item['filename']}\nАвтор: {item['author']}\nСтатус: {item['status']}\nКраткий анализ: {item['summary']}\n---"
+        combined_summary = self._reduce_summaries([
+            f"Файл: {item['filename']}\nАвтор: {item['author']}\nСтатус: {item['status']}\n"
+            f"Коммитов с изменениями: {item.get('commit_count', 1)}\nКраткий анализ: {item['summary']}\n---"
             for item in self.summaries
         ])
-        truncated_summary = combined_summary[:MAX_SUMMARY_LEN]
-        if len(combined_summary) > MAX_SUMMARY_LEN:
-             logger.warning(f"Объединенное резюме для общего анализа обрезано до {MAX_SUMMARY_LEN} символов.")
 
         total_files_safe = self.total_files if self.total_files > 0 else 1
         task_weight = 100 / total_files_safe
@@ -252,128 +512,310 @@ class CodeAnalyzer:
             },
             {
                 "role": "user",
-                "text": f"Вот краткие анализы файлов:\n\n{combined_summary[:6000]}\n\n"
+                "text": f"Вот краткие анализы файлов:\n\n{combined_summary}\n\n"
                         "Сделай общий вывод о кодовой базе, выявленные проблемы, выявленные антипаттерны, положительные моменты и рекоменадции должны быть на высоком уровне(минимум мидл), расписывай эти пункты на 6-8 предложений, обязателтно помечай заголовки пунктов:"
             }
         ]
 
         try:
-            result = self.sdk.models.completions("yandexgpt").configure(temperature=0.3, max_tokens=2000).run(messages)
+            result = self._complete(messages, temperature=0.3, max_tokens=2000)
             logger.info("Общий анализ кодовой базы завершен.")
-            return result[0].text if result and result[0] else "Не удалось сгенерировать общий анализ."
+            return result or "Не удалось сгенерировать общий анализ."
         except Exception as e:
             logger.error(f"Ошибка вызова YandexGPT API для общего анализа: {e}", exc_info=True)
             return f"Ошибка при генерации общего анализа: {e}"
 
-    def process_json_and_generate_pdf(self, input_json_path: str, output_pdf_path: str) -> str:
-        logger.info(f"Начало обработки LLM для JSON: {input_json_path}")
-        self.analysis_results = []
-        self.summaries = []
-        self.authors_stats = defaultdict(list)
-        self.total_files = 0
-        self.completed_files = 0
-        self.partial_files = 0
-        self.incomplete_files = 0
+    def _analyze_file(self, index: int, file_data: dict) -> dict | None:
+        filename = file_data.get('filename')
+        author_email = file_data.get('author_email')
+        code = file_data.get('code')
+        content_type = file_data.get('content_type', 'file')
+        commit_count = file_data.get('commit_count', 1)
+
+        if not all([filename, author_email, code]):
+            logger.warning(f"Пропуск файла {index}: отсутствуют необходимые данные (filename, author_email, code). Данные: {file_data.keys()}")
+            return None
+
+        logger.info(f"[{index}] Анализ файла: {filename} (Автор: {author_email})")
+        record = self._make_record(file_data)
 
         try:
-            with open(input_json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except FileNotFoundError:
-            logger.error(f"Ошибка: JSON файл не найден: {input_json_path}")
-            raise
-        except json.JSONDecodeError as e:
-             logger.error(f"Ошибка декодирования JSON файла {input_json_path}: {e}")
-             raise ValueError(f"Некорректный формат JSON файла: {input_json_path}") from e
+            code_str = str(code) if not isinstance(code, str) else code
+            raw_text = self.analyze_code(code_str, filename, author_email, content_type)
+
+            if raw_text:
+                logger.debug(f"Результат анализа для {filename}:\n{raw_text[:300]}...")
+                status, summary_text = self._parse_status(raw_text)
+                record["status"] = status
+                record["summary"] = summary_text[:700]
+            else:
+                logger.warning(f"Не получен результат анализа от LLM для файла {filename}. Пропуск.")
+                record["status"] = "FAILED_ANALYSIS"
+                record["summary"] = "[Анализ не удался или не вернул результат]"
+        except Exception as file_analysis_err:
+            logger.error(f"Ошибка при обработке файла {filename}: {file_analysis_err}", exc_info=True)
+            record["status"] = "ERROR"
+            record["summary"] = f"[Ошибка обработки файла: {file_analysis_err}]"
+
+        return record
+
+    def _reduce_chunks(self, index: int, file_data: dict, chunk_texts: list) -> dict:
+        filename = file_data['filename']
+        record = self._make_record(file_data)
+        analyses = [text for text in chunk_texts if text]
+        if not analyses:
+            logger.warning(f"Не получен результат анализа от LLM ни для одного фрагмента файла {filename}.")
+            record["status"] = "FAILED_ANALYSIS"
+            record["summary"] = "[Анализ не удался или не вернул результат]"
+            return record
+
+        chunk_statuses = [self._parse_status(text)[0] for text in analyses]
+        messages = [
+            {"role": "system", "text": CHUNK_REDUCE_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "text": f"Анализы фрагментов файла {filename}:\n\n" + "\n\n".join(
+                    f"--- Фрагмент {n}/{len(chunk_texts)} ---\n{text}" for n, text in enumerate(chunk_texts, 1) if text
+                )
+            }
+        ]
+        try:
+            raw_text = self._complete(messages, temperature=0.2, max_tokens=1500, parse_status=True)
         except Exception as e:
-             logger.error(f"Не удалось прочитать JSON файл {input_json_path}: {e}")
-             raise
+            logger.error(f"Ошибка объединения анализов фрагментов файла {filename}: {e}", exc_info=True)
+            raw_text = None
 
-        if "files" not in data or not isinstance(data["files"], list):
-             logger.error(f"Некорректная структура JSON: отсутствует ключ 'files' или он не является списком в {input_json_path}")
-             raise ValueError(f"Некорректная структура JSON в {input_json_path}")
-
-        self.total_files = len(data["files"])
-        if self.total_files == 0:
-            logger.warning(f"В JSON файле {input_json_path} нет файлов для анализа.")
-            report_content = "В предоставленном JSON отчете не найдено файлов для анализа."
-            report_title = f"Анализ кодовой базы (Файлы не найдены)"
-            PDFGenerator.save_to_pdf(output_pdf_path, report_title, report_content)
-            logger.info(f"Пустой отчет PDF сохранен: {output_pdf_path}, так как файлы не найдены.")
-            return output_pdf_path
+        if raw_text and raw_text.upper().startswith("[STATUS:"):
+            status, summary_text = self._parse_status(raw_text)
+        else:
+            status = next((candidate for candidate in ("INCOMPLETE", "PARTIAL", "COMPLETED") if candidate in chunk_statuses), "INCOMPLETE")
+            summary_text = "\n".join(self._parse_status(text)[1] for text in analyses)
+        if len(analyses) < len(chunk_texts):
+            status = "INCOMPLETE" if status == "COMPLETED" else status
 
+        logger.info(f"[{index}] Анализ файла {filename} по {len(chunk_texts)} фрагментам завершен.")
+        record["status"] = status
+        record["summary"] = summary_text[:700]
+        return record
 
-        logger.info(f"Начинаем анализ {self.total_files} файлов из {input_json_path}...")
-        files_to_process = data["files"]
+    @staticmethod
+    def _make_record(file_data: dict, status: str | None = None, summary: str = "") -> dict:
+        return {
+            "filename": file_data.get('filename'),
+            "author": file_data.get('author_email'),
+            "commit_count": file_data.get('commit_count', 1),
+            "status": status,
+            "summary": summary[:700]
+        }
 
-        for i, file_data in enumerate(files_to_process, 1):
-            filename = file_data.get('filename')
-            author_email = file_data.get('author_email')
-            code = file_data.get('code')
+    @staticmethod
+    def _split_batch_response(raw_text: str) -> dict:
+        sections = {}
+        matches = list(BATCH_SECTION_RE.finditer(raw_text))
+        for pos, match in enumerate(matches):
+            end = matches[pos + 1].start() if pos + 1 < len(matches) else len(raw_text)
+            sections[int(match.group(1))] = raw_text[match.end():end].strip()
+        return sections
+
+    def _analyze_batch(self, batch: list) -> list:
+        parts = []
+        for n, (_, file_data) in enumerate(batch, 1):
+            kind = " (unified diff)" if file_data.get('content_type') == 'diff' else ""
+            parts.append(f"### FILE {n}: {file_data['filename']}{kind}\n{file_data['code']}")
+        messages = [
+            {"role": "system", "text": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "text": "Проанализируй следующие файлы:\n\n" + "\n\n".join(parts)}
+        ]
+        logger.info(f"Пакетный анализ {len(batch)} файлов: {', '.join(fd['filename'] for _, fd in batch)}")
 
-            if not all([filename, author_email, code]):
-                logger.warning(f"Пропуск файла {i}/{self.total_files}: отсутствуют необходимые данные (filename, author_email, code). Данные: {file_data.keys()}")
-                continue
+        try:
+            raw_text = self._complete(messages, temperature=0.2, max_tokens=min(400 * len(batch) + 400, 4000),
+                                      use_cache=False)
+        except Exception as e:
+            logger.error(f"Ошибка пакетного вызова YandexGPT API: {e}", exc_info=True)
+            raw_text = None
+
+        sections = self._split_batch_response(raw_text or "")
+        results = []
+        for n, (index, file_data) in enumerate(batch, 1):
+            section = sections.get(n, "")
+            if section.upper().startswith("[STATUS:"):
+                status, summary_text = self._parse_status(section)
+                llm_cache.put(self._analysis_cache_key(file_data), LLM_MODEL, section, status)
+                results.append((index, self._make_record(file_data, status, summary_text)))
+            else:
+                logger.warning(f"Не удалось разобрать пакетный ответ для {file_data['filename']}, анализируем отдельно.")
+                results.append((index, self._analyze_file(index, file_data)))
+        return results
+
+    def _cached_analysis(self, file_data: dict) -> dict | None:
+        cached = llm_cache.get(self._analysis_cache_key(file_data))
+        if not cached:
+            return None
+        status, summary_text = self._parse_status(cached['text'])
+        return self._make_record(file_data, status, summary_text)
+
+    def _record_analysis(self, record: dict):
+        status = record["status"]
+        self.total_commits += record["commit_count"]
+        if status == "COMPLETED":
+            self.completed_files += 1
+        elif status == "PARTIAL":
+            self.partial_files += 1
+        else:
+            self.incomplete_files += 1
 
-            logger.info(f"[{i}/{self.total_files}] Анализ файла: {filename} (Автор: {author_email})")
+        self.summaries.append(record)
+        if status in ("COMPLETED", "PARTIAL", "INCOMPLETE"):
+            self.authors_stats[record["author"]].append({
+                "filename": record["filename"],
+                "status": status,
+                "commit_count": record["commit_count"]
+            })
 
-            try:
-                code_str = str(code) if not isinstance(code, str) else code
-                analysis_result = self.analyze_code(code_str, filename, author_email)
-
-                if analysis_result and analysis_result[0]:
-                    alternative = analysis_result[0]
-                    raw_text = alternative.text
-                    logger.debug(f"Результат анализа для {filename}:\n{raw_text[:300]}...")
-
-                    status = "INCOMPLETE"
-                    text_upper = raw_text.upper()
-                    if text_upper.startswith("[STATUS: COMPLETED]"):
-                         status = "COMPLETED"
-                         self.completed_files += 1
-                    elif text_upper.startswith("[STATUS: PARTIAL]"):
-                         status = "PARTIAL"
-                         self.partial_files += 1
-                    else:
-                        if text_upper.startswith("[STATUS: INCOMPLETE]"):
-                             status = "INCOMPLETE"
-                        self.incomplete_files += 1
-
-                    summary_text = raw_text
-                    if summary_text.startswith("[STATUS:"):
-                        end_bracket_index = summary_text.find("]")
-                        if end_bracket_index != -1:
-                            summary_text = summary_text[end_bracket_index+1:].strip()
-
-                    self.summaries.append({
-                        "filename": filename,
-                        "author": author_email,
-                        "status": status,
-                        "summary": summary_text[:700]
-                    })
-
-                    self.authors_stats[author_email].append({
-                        "filename": filename,
-                        "status": status
-                    })
-                else:
-                    logger.warning(f"Не получен результат анализа от LLM для файла {filename}. Пропуск.")
-                    self.summaries.append({
-                        "filename": filename,
-                        "author": author_email,
-                        "status": "FAILED_ANALYSIS",
-                        "summary": "[Анализ не удался или не вернул результат]"
-                    })
-                    self.incomplete_files += 1
-            except Exception as file_analysis_err:
-                logger.error(f"Ошибка при обработке файла {filename}: {file_analysis_err}", exc_info=True)
-                self.summaries.append({
-                    "filename": filename,
-                    "author": author_email,
-                    "status": "ERROR",
-                    "summary": f"[Ошибка обработки файла: {file_analysis_err}]"
-                })
-                self.incomplete_files += 1
+    def _reset_stats(self):
+        self.analysis_results = []
+        self.summaries = []
+        self.authors_stats = defaultdict(list)
+        self.total_files = 0
+        self.total_commits = 0
+        self.completed_files = 0
+        self.partial_files = 0
+        self.incomplete_files = 0
+        self.general_analysis_text = None
+
+    def _file_kind(self, file_data: dict) -> str:
+        code = file_data.get('code')
+        if not isinstance(code, str) or not file_data.get('filename') or not file_data.get('author_email'):
+            return 'single'
+        tokens = estimate_tokens(code)
+        if tokens > Config.LLM_CHUNK_MAX_TOKENS:
+            return 'large'
+        if self.batching and tokens <= Config.LLM_BATCH_SMALL_FILE_TOKENS:
+            return 'small'
+        return 'single'
+
+    def _analyze_large_file(self, submit, index: int, file_data: dict) -> list:
+        chunks = split_code(file_data['code'], file_data['filename'], Config.LLM_CHUNK_MAX_TOKENS)
+        logger.info(f"[{index}] Файл {file_data['filename']} разбит на {len(chunks)} фрагментов")
+        return [
+            submit(self.analyze_code, chunk, file_data['filename'], file_data.get('author_email'),
+                   file_data.get('content_type', 'file'), (n, len(chunks)))
+            for n, chunk in enumerate(chunks, 1)
+        ]
 
+    def analyze_files(self, files: Iterable[dict], commit_counts: dict | None = None,
+                      executor: ThreadPoolExecutor | None = None) -> int:
+        self._reset_stats()
+        in_flight = threading.BoundedSemaphore(self.max_workers * 2)
+
+        def submit(fn, *args):
+            in_flight.acquire()
+            future = executor.submit(fn, *args)
+            future.add_done_callback(lambda _: in_flight.release())
+            return future
+
+        results = []
+        pending = []
+        batch = []
+        batch_tokens = 0
+        batch_count = 0
+
+        def flush_batch():
+            nonlocal batch, batch_tokens, batch_count
+            if len(batch) == 1:
+                index, file_data = batch[0]
+                pending.append(('single', index, submit(self._analyze_file, index, file_data)))
+            elif batch:
+                pending.append(('batch', None, submit(self._analyze_batch, batch)))
+                batch_count += 1
+            batch, batch_tokens = [], 0
+
+        index = 0
+        with nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for index, file_data in enumerate(files, 1):
+                kind = self._file_kind(file_data)
+                if kind == 'small':
+                    cached_record = self._cached_analysis(file_data)
+                    if cached_record:
+                        results.append((index, cached_record))
+                        continue
+                    tokens = estimate_tokens(file_data['code'])
+                    if batch and (batch_tokens + tokens > Config.LLM_BATCH_MAX_TOKENS
+                                  or len(batch) >= Config.LLM_BATCH_MAX_FILES):
+                        flush_batch()
+                    batch.append((index, file_data))
+                    batch_tokens += tokens
+                elif kind == 'large':
+                    pending.append(('chunks', (index, file_data), self._analyze_large_file(submit, index, file_data)))
+                else:
+                    pending.append(('single', index, submit(self._analyze_file, index, file_data)))
+            flush_batch()
+            self.total_files = index
+            if batch_count:
+                logger.info(f"Малые файлы объединены в {batch_count} пакетов")
+
+            reduce_futures = []
+            for kind, key, future in pending:
+                if kind == 'batch':
+                    results.extend(future.result())
+                elif kind == 'single':
+                    results.append((key, future.result()))
+                else:
+                    chunk_index, file_data = key
+                    reduce_futures.append((chunk_index, executor.submit(
+                        self._reduce_chunks, chunk_index, file_data, [f.result() for f in future]
+                    )))
+            for chunk_index, future in reduce_futures:
+                results.append((chunk_index, future.result()))
+
+        results.sort(key=lambda item: item[0])
+        for _, record in results:
+            if record:
+                if commit_counts:
+                    record["commit_count"] = commit_counts.get((record["author"], record["filename"]),
+                                                               record["commit_count"])
+                self._record_analysis(record)
+        return self.total_files
+
+    def merge_previous_analyses(self, records: list) -> int:
+        current = {(r["author"], r["filename"]): r for r in self.summaries}
+        merged = list(self.summaries)
+        reused = 0
+        for record in records:
+            key = (record.get("author"), record.get("filename"))
+            if key in current:
+                current[key]["commit_count"] += record.get("commit_count", 1)
+                continue
+            merged.append(dict(record))
+            reused += 1
+
+        total_files = self.total_files + reused
+        self._reset_stats()
+        self.total_files = total_files
+        for record in merged:
+            self._record_analysis(record)
+        logger.info(f"Повторно использовано анализов из предыдущего отчета: {reused}")
+        return reused
+
+    def author_rows(self) -> list:
+        rows = []
+        for author, files in self.authors_stats.items():
+            author_total = len(files)
+            if author_total > 0:
+                author_completed = sum(1 for f in files if f["status"] == "COMPLETED")
+                author_partial = sum(1 for f in files if f["status"] == "PARTIAL")
+                author_incomplete = author_total - author_completed - author_partial
+                author_percentage = (author_completed + author_partial * 0.5) / author_total * 100
+                author_commits = sum(f.get("commit_count", 1) for f in files)
+                rows.append([author, author_total, author_commits, author_completed,
+                             author_partial, author_incomplete, f"{author_percentage:.1f}%"])
+        return rows
+
+    def generate_report_pdf(self, output_pdf_path: str, report_title: str | None = None) -> str:
+        cache_stats = llm_cache.stats()
+        logger.info(f"Кэш LLM: попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}, "
+                    f"доля попаданий {cache_stats['hit_rate']:.0%}")
 
         logger.info("\n=== Генерация общего анализа кодовой базы ===")
         try:
@@ -383,6 +825,7 @@ class CodeAnalyzer:
              logger.error(f"Критическая ошибка при генерации общего анализа: {general_analysis_err}", exc_info=True)
              general_analysis_text = f"\n\n!! Ошибка при генерации общего отчета: {general_analysis_err} !!"
 
+        self.general_analysis_text = general_analysis_text
         report_content = general_analysis_text
 
         total_files_safe = self.total_files if self.total_files > 0 else 1
@@ -391,33 +834,22 @@ class CodeAnalyzer:
 
         stats_content = "\n\n\n=== ДЕТАЛЬНАЯ СТАТИСТИКА ПО ФАЙЛАМ ===\n"
         stats_content += f"Общее количество файлов для анализа: {self.total_files}\n"
+        stats_content += f"Изменений файлов в коммитах (до объединения): {self.total_commits}\n"
         stats_content += f"Завершено полностью (COMPLETED): {self.completed_files}\n"
         stats_content += f"Завершено частично (PARTIAL): {self.partial_files}\n"
         stats_content += f"Требует доработки (INCOMPLETE/ERROR/FAILED): {self.incomplete_files}\n"
         stats_content += f"Общий процент выполнения (оценка): {completion_percentage:.1f}%\n"
 
-        stats_content += "\nСтатистика по авторам:\n"
-        if self.authors_stats:
-            for author, files in self.authors_stats.items():
-                author_total = len(files)
-                if author_total > 0:
-                    author_completed = sum(1 for f in files if f["status"] == "COMPLETED")
-                    author_partial = sum(1 for f in files if f["status"] == "PARTIAL")
-                    author_incomplete = author_total - author_completed - author_partial
-                    author_percentage = (author_completed + author_partial * 0.5) / author_total * 100
-                    stats_content += (f"\n- **{author}** ({author_total} файлов):\n"
-                                    f"  Завершено: {author_completed}\n"
-                                    f"  Частично: {author_partial}\n"
-                                    f"  Не завершено/Ошибки: {author_incomplete}\n"
-                                    f"  Процент выполнения (оценка): {author_percentage:.1f}%\n")
-        else:
-            stats_content += "Нет данных по авторам.\n"
+        author_rows = self.author_rows()
+        if not author_rows:
+            stats_content += "\nСтатистика по авторам:\nНет данных по авторам.\n"
 
         report_content += stats_content
 
-        report_title = f"Анализ кодовой базы (Отчет {datetime.now().strftime('%Y-%m-%d')})"
+        report_title = report_title or f"Анализ кодовой базы (Отчет {datetime.now().strftime('%Y-%m-%d')})"
         try:
-            PDFGenerator.save_to_pdf(output_pdf_path, report_title, report_content)
+            tables = [("Статистика по авторам", AUTHOR_STATS_HEADER, author_rows)] if author_rows else None
+            PDFGenerator.save_to_pdf(output_pdf_path, report_title, report_content, tables)
             logger.info(f"Итоговый PDF отчет сохранен: {output_pdf_path}")
             return output_pdf_path
         except Exception as pdf_err:
@@ -2,6 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from datetime import datetime, timezone
 import os
+import json
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -14,6 +15,7 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
 
     reports = db.relationship('Report', backref='author', lazy=True, cascade="all, delete-orphan")
+    batch_reports = db.relationship('BatchReport', backref='author', lazy=True, cascade="all, delete-orphan")
 
     def set_password(self, password):
         self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
@@ -34,18 +36,84 @@ class Report(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     report_dir_path = db.Column(db.String(300), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    analysis_mode = db.Column(db.String(10), nullable=False, default='full')
+    dedup_key = db.Column(db.String(64), nullable=True, index=True)
+    leader_id = db.Column(db.String(36), db.ForeignKey('report.id'), nullable=True, index=True)
 
     llm_status = db.Column(db.String(20), nullable=False, default='pending')
     pdf_report_path = db.Column(db.String(350), nullable=True)
 
 
+    @property
+    def artifact_id(self) -> str:
+        return self.leader_id or self.id
+
     def get_report_file_path(self):
         if not self.report_dir_path:
             return None
-        return os.path.join(self.report_dir_path, f"report_{self.id}.json")
+        paths = [os.path.join(self.report_dir_path, f"report_{self.artifact_id}{suffix}")
+                 for suffix in ('.jsonl.gz', '.jsonl', '.json')]
+        return next((path for path in paths if os.path.exists(path)), paths[0])
+
+    def get_analysis_file_path(self):
+        if not self.report_dir_path:
+            return None
+        paths = [os.path.join(self.report_dir_path, f"analysis_{self.artifact_id}{suffix}")
+                 for suffix in ('.json.gz', '.json')]
+        return next((path for path in paths if os.path.exists(path)), paths[0])
 
     def get_pdf_report_file_path(self) -> str | None:
         return self.pdf_report_path
 
     def __repr__(self):
-        return f'<Report {self.id} for User {self.user_id} Status: {self.status} LLM: {self.llm_status}>'
\ No newline at end of file
+        return f'<Report {self.id} for User {self.user_id} Status: {self.status} LLM: {self.llm_status}>'
+
+
+class BatchReport(db.Model):
+    id = db.Column(db.String(36), primary_key=True)
+    repos = db.Column(db.Text, nullable=False, default='[]')
+    emails = db.Column(db.Text, nullable=False, default='[]')
+    date_range = db.Column(db.String(50), nullable=False)
+    analysis_mode = db.Column(db.String(10), nullable=False, default='full')
+    status = db.Column(db.String(20), nullable=False, default='processing')
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    report_dir_path = db.Column(db.String(300), nullable=True)
+    summary_pdf_path = db.Column(db.String(350), nullable=True)
+    results = db.Column(db.Text, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    def get_repos(self) -> list:
+        return json.loads(self.repos or '[]')
+
+    def get_emails(self) -> list:
+        return json.loads(self.emails or '[]')
+
+    def get_results(self) -> dict:
+        return json.loads(self.results or '{}')
+
+    def __repr__(self):
+        return f'<BatchReport {self.id} for User {self.user_id} Status: {self.status}>'
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False, default='report')
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    report_id = db.Column(db.String(36), db.ForeignKey('report.id'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    def get_payload(self) -> dict:
+        return json.loads(self.payload or '{}')
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} Status: {self.status} Attempts: {self.attempts}/{self.max_attempts}>'
@@ -0,0 +1,51 @@
+import os
+import time
+import argparse
+import tempfile
+from llm_processor import PDFGenerator, AUTHOR_STATS_HEADER, get_pdf_renderer
+
+
+def make_content(files: int) -> str:
+    blocks = ["=== ОБЩИЙ АНАЛИЗ ===\n**1. Email автора**\n- dev@example.com\n\n**3. Общая оценка кода**\nОценка: 7/10"]
+    for n in range(files):
+        blocks.append(
+            f"### src/module_{n}.py\n"
+            f"Статус: PARTIAL. Функция `process<{n}>` смешивает загрузку и валидацию данных & логирование.\n"
+            + "Рекомендуется выделить слой доступа к данным и покрыть его тестами. " * 6
+        )
+    return "\n\n".join(blocks)
+
+
+def make_author_rows(authors: int) -> list:
+    return [[f"dev{n}@example.com", 12, 30, 6, 4, 2, "66.7%"] for n in range(authors)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure PDF report rendering throughput")
+    parser.add_argument('--reports', type=int, default=20)
+    parser.add_argument('--files', type=int, default=60)
+    parser.add_argument('--authors', type=int, default=15)
+    args = parser.parse_args()
+
+    content = make_content(args.files)
+    tables = [("Статистика по авторам", AUTHOR_STATS_HEADER, make_author_rows(args.authors))]
+
+    start = time.perf_counter()
+    PDFGenerator.preload_fonts()
+    renderer = get_pdf_renderer()
+    setup_seconds = time.perf_counter() - start
+
+    pages = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        for n in range(args.reports):
+            pages += renderer.render(os.path.join(tmp_dir, f"bench_{n}.pdf"), f"Benchmark {n}", content, tables)
+        elapsed = time.perf_counter() - start
+
+    print(f"Fonts and styles: {setup_seconds:.2f}s")
+    print(f"Rendered {args.reports} reports, {pages} pages in {elapsed:.2f}s")
+    print(f"{args.reports / elapsed:.1f} reports/s, {pages / elapsed:.1f} pages/s")
+
+
+if __name__ == '__main__':
+    main()
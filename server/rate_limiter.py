@@ -0,0 +1,210 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitGovernor:
+    def __init__(self, tokens: List[str], reserve: int, pacing_threshold: float, secondary_backoff: int,
+                 state_path: str):
+        self.tokens = list(tokens) or [None]
+        self.reserve = reserve
+        self.pacing_threshold = pacing_threshold
+        self.secondary_backoff = secondary_backoff
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._buckets = {}
+        self._blocked_until = {token: 0.0 for token in self.tokens}
+        self._labels = {token: f"token-{n}" if token else "anonymous" for n, token in enumerate(self.tokens)}
+        self._tokens_by_label = {label: token for token, label in self._labels.items()}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.state_path, check_same_thread=False, timeout=30,
+                                         isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " label TEXT NOT NULL,"
+                " resource TEXT NOT NULL,"
+                " rate_limit INTEGER,"
+                " remaining INTEGER,"
+                " reset_at REAL NOT NULL,"
+                " next_slot REAL NOT NULL,"
+                " PRIMARY KEY (label, resource))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blocks (label TEXT PRIMARY KEY, blocked_until REAL NOT NULL)"
+            )
+        return self._conn
+
+    @contextmanager
+    def _shared_state(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._buckets = {}
+                self._blocked_until = {token: 0.0 for token in self.tokens}
+                for label, resource, limit, remaining, reset_at, next_slot in conn.execute(
+                        "SELECT label, resource, rate_limit, remaining, reset_at, next_slot FROM buckets"):
+                    if label in self._tokens_by_label:
+                        self._buckets[(self._tokens_by_label[label], resource)] = {
+                            'limit': limit,
+                            'remaining': remaining,
+                            'reset_at': reset_at,
+                            'next_slot': next_slot
+                        }
+                for label, blocked_until in conn.execute("SELECT label, blocked_until FROM blocks"):
+                    if label in self._tokens_by_label:
+                        self._blocked_until[self._tokens_by_label[label]] = blocked_until
+
+                yield
+
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (label, resource, rate_limit, remaining, reset_at, next_slot) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(self._labels[token], resource, bucket['limit'], bucket['remaining'],
+                      bucket['reset_at'], bucket['next_slot'])
+                     for (token, resource), bucket in self._buckets.items()]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO blocks (label, blocked_until) VALUES (?, ?)",
+                    [(self._labels[token], blocked_until) for token, blocked_until in self._blocked_until.items()]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _bucket(self, token: Optional[str], resource: str) -> Dict:
+        return self._buckets.setdefault((token, resource), {
+            'limit': None,
+            'remaining': None,
+            'reset_at': 0.0,
+            'next_slot': 0.0
+        })
+
+    def _budget(self, token: Optional[str], resource: str, now: float) -> float:
+        bucket = self._bucket(token, resource)
+        if bucket['remaining'] is None or bucket['reset_at'] <= now:
+            return float('inf')
+        return bucket['remaining'] - self.reserve
+
+    def _reserve_slot(self, resource: str) -> Tuple[float, bool, Optional[str]]:
+        now = time.time()
+        available = [token for token in self.tokens if self._blocked_until[token] <= now]
+        token = max(available, key=lambda t: self._budget(t, resource, now)) if available else None
+
+        if not available or self._budget(token, resource, now) <= 0:
+            waits = []
+            for candidate in self.tokens:
+                wait = self._blocked_until[candidate] - now
+                if self._budget(candidate, resource, now) <= 0:
+                    wait = max(wait, self._bucket(candidate, resource)['reset_at'] - now + 1)
+                waits.append(max(wait, 0.0))
+            return min(waits), False, None
+
+        bucket = self._bucket(token, resource)
+        remaining = bucket['remaining']
+        if remaining is None or bucket['reset_at'] <= now:
+            return 0.0, True, token
+
+        bucket['remaining'] = remaining - 1
+        limit = bucket['limit'] or remaining
+        if remaining > limit * self.pacing_threshold:
+            return 0.0, True, token
+
+        interval = (bucket['reset_at'] - now) / (remaining - self.reserve)
+        slot = max(now, bucket['next_slot'])
+        bucket['next_slot'] = slot + interval
+        return slot - now, True, token
+
+    def acquire(self, resource: str = 'core') -> Optional[str]:
+        while True:
+            with self._shared_state():
+                wait, reserved, token = self._reserve_slot(resource)
+            if wait > 5:
+                scope = self._labels[token] if reserved else "все токены"
+                logger.warning(f"Лимит GitHub API ({resource}, {scope}): ждем {wait:.0f} сек")
+            if wait > 0:
+                time.sleep(wait)
+            if reserved:
+                return token
+
+    def update(self, response, token: Optional[str] = None, resource: Optional[str] = None) -> bool:
+        headers = response.headers
+        resource = headers.get('X-RateLimit-Resource') or resource or 'core'
+        token = token if token in self._blocked_until else self.tokens[0]
+        now = time.time()
+
+        with self._shared_state():
+            bucket = self._bucket(token, resource)
+            try:
+                if 'X-RateLimit-Remaining' in headers:
+                    bucket['remaining'] = int(headers['X-RateLimit-Remaining'])
+                if 'X-RateLimit-Limit' in headers:
+                    bucket['limit'] = int(headers['X-RateLimit-Limit'])
+                if 'X-RateLimit-Reset' in headers:
+                    bucket['reset_at'] = float(headers['X-RateLimit-Reset'])
+            except ValueError:
+                logger.warning(f"Некорректные заголовки лимитов GitHub: {dict(headers)}")
+
+            if response.status_code not in (403, 429):
+                if self._blocked_until[token] and self._blocked_until[token] <= now:
+                    self._blocked_until[token] = 0.0
+                return False
+
+            retry_after = headers.get('Retry-After')
+            if retry_after is not None:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    delay = self.secondary_backoff
+            elif bucket['remaining'] == 0 and bucket['reset_at'] > now:
+                delay = bucket['reset_at'] - now + 1
+            elif response.status_code == 429 or 'rate limit' in response.text.lower():
+                delay = self.secondary_backoff
+            else:
+                return False
+
+            self._blocked_until[token] = max(self._blocked_until[token], now + delay)
+            logger.warning(f"GitHub вернул {response.status_code} (лимит запросов) для {self._labels[token]}, "
+                           f"токен выведен из ротации на {delay:.0f} сек")
+            return True
+
+    def snapshot(self) -> Dict:
+        with self._shared_state():
+            now = time.time()
+            return {
+                'tokens': [
+                    {
+                        'token': self._labels[token],
+                        'blocked_for': max(0.0, self._blocked_until[token] - now),
+                        'resources': {
+                            resource: {
+                                'limit': bucket['limit'],
+                                'remaining': bucket['remaining'],
+                                'reset_in': max(0.0, bucket['reset_at'] - now)
+                            } for (bucket_token, resource), bucket in self._buckets.items() if bucket_token == token
+                        }
+                    } for token in self.tokens
+                ]
+            }
+
+
+rate_governor = RateLimitGovernor(
+    tokens=Config.GITHUB_TOKENS,
+    reserve=Config.GITHUB_RATE_LIMIT_RESERVE,
+    pacing_threshold=Config.GITHUB_RATE_LIMIT_PACING_THRESHOLD,
+    secondary_backoff=Config.GITHUB_SECONDARY_BACKOFF,
+    state_path=Config.GITHUB_RATE_STATE_PATH
+)
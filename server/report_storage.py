@@ -0,0 +1,106 @@
+import os
+import gzip
+import json
+import logging
+from datetime import datetime, timezone
+from config import Config
+from content_store import content_store
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMAT_VERSION = 2
+
+
+def report_file_path(report_dir_path: str, report_id: str) -> str:
+    return os.path.join(report_dir_path, f"report_{report_id}.jsonl.gz")
+
+
+def blob_refs_path(report_dir_path: str, report_id: str) -> str:
+    return os.path.join(report_dir_path, f"report_{report_id}.refs")
+
+
+def open_artifact(path: str, mode: str = 'r'):
+    if path.endswith('.gz'):
+        return gzip.open(path, f"{mode}t", encoding='utf-8', compresslevel=Config.REPORT_COMPRESSION_LEVEL)
+    return open(path, mode, encoding='utf-8')
+
+
+def write_json_artifact(path: str, data: dict):
+    tmp_path = os.path.join(os.path.dirname(path), f".tmp-{os.path.basename(path)}")
+    with open_artifact(tmp_path, 'w') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_json_artifact(path: str) -> dict:
+    with open_artifact(path) as f:
+        return json.load(f)
+
+
+class ReportWriter:
+    def __init__(self, report_id: str, report_dir_path: str):
+        self.report_id = report_id
+        self.path = report_file_path(report_dir_path, report_id)
+        self.refs_path = blob_refs_path(report_dir_path, report_id)
+        self.count = 0
+        self.blob_refs = set()
+        self._file = None
+        self._refs_file = None
+
+    def _write_line(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write('\n')
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open_artifact(self.path, 'w')
+        self._refs_file = open(self.refs_path, 'w', encoding='utf-8')
+        self._write_line({
+            "type": "header",
+            "format_version": REPORT_FORMAT_VERSION,
+            "report_id": self.report_id,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+        return self
+
+    def write(self, file_data: dict) -> dict:
+        code = file_data.get('code')
+        if isinstance(code, str):
+            code_ref = content_store.put(code)
+            if code_ref not in self.blob_refs:
+                self.blob_refs.add(code_ref)
+                self._refs_file.write(f"{code_ref}\n")
+                self._refs_file.flush()
+            file_data = {key: value for key, value in file_data.items() if key != 'code'}
+            file_data['code_ref'] = code_ref
+        self._write_line({"type": "file", "data": file_data})
+        self.count += 1
+        return file_data
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._file.close()
+        finally:
+            self._refs_file.close()
+        if exc_type is None:
+            logger.info(f"JSONL report saved: {self.path} ({self.count} files)")
+        return False
+
+
+def report_blob_refs(report_dir_path: str, report_id: str, scan_report: bool = True) -> set:
+    refs_path = blob_refs_path(report_dir_path, report_id)
+    if os.path.exists(refs_path):
+        with open(refs_path, 'r', encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+    if not scan_report:
+        return set()
+
+    path = report_file_path(report_dir_path, report_id)
+    if not os.path.exists(path):
+        return set()
+    refs = set()
+    with open_artifact(path) as f:
+        for line in f:
+            if '"code_ref"' in line:
+                refs.add(json.loads(line)['data']['code_ref'])
+    return refs
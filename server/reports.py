@@ -1,38 +1,214 @@
 import os
-import json
-from datetime import datetime, timezone
-from github_api import get_github_files
+import queue
+import threading
+import itertools
+from typing import Iterable, Iterator
+from github_api import iter_repository_files
 import logging
-from models import db, Report
+from models import db, Report, BatchReport
 from config import Config
+from report_storage import ReportWriter, read_json_artifact, write_json_artifact, report_blob_refs
+from content_store import content_store
 from llm_processor import CodeAnalyzer, PDFGenerator
 
 logger = logging.getLogger(__name__)
 
+_END_OF_STREAM = object()
+ANALYZED_STATUSES = ("COMPLETED", "PARTIAL", "INCOMPLETE")
 
-def generate_json_report(report_id: str, files_data: list, report_dir_path: str):
+
+def deduplicate_files(files_data: list) -> list:
+    collapsed = {}
+    patches = {}
+    for file_data in files_data:
+        key = (file_data.get('author_email'), file_data.get('filename'))
+        existing = collapsed.get(key)
+        if existing is None:
+            collapsed[key] = dict(file_data, commit_count=1)
+            patches[key] = [file_data]
+            continue
+
+        existing['commit_count'] += 1
+        if file_data.get('content_type') == 'diff':
+            patches[key].append(file_data)
+        elif (file_data.get('commit_date') or '') > (existing.get('commit_date') or ''):
+            collapsed[key] = dict(file_data, commit_count=existing['commit_count'])
+
+    for key, file_data in collapsed.items():
+        if file_data.get('content_type') != 'diff' or file_data['commit_count'] == 1:
+            continue
+        ordered = sorted(patches[key], key=lambda f: f.get('commit_date') or '')
+        file_data['code'] = "\n".join(
+            f"# commit {(f.get('commit_sha') or '')[:12]} ({f.get('commit_date')})\n{f.get('code', '')}"
+            for f in ordered
+        )
+        file_data['commit_sha'] = ordered[-1].get('commit_sha')
+        file_data['commit_date'] = ordered[-1].get('commit_date')
+
+    return list(collapsed.values())
+
+
+def iter_unique_files(files_data: Iterable[dict], commit_counts: dict) -> Iterator[dict]:
+    for file_data in files_data:
+        key = (file_data.get('author_email'), file_data.get('filename'))
+        if key in commit_counts:
+            commit_counts[key] += 1
+            continue
+        commit_counts[key] = 1
+        yield dict(file_data, commit_count=1)
+
+
+def _track_commit_dates(files_data: Iterable[dict], commit_dates: dict) -> Iterator[dict]:
+    for file_data in files_data:
+        key = (file_data.get('author_email'), file_data.get('filename'))
+        commit_dates.setdefault(key, []).append(file_data.get('commit_date'))
+        yield file_data
+
+
+def collapse_files(files: Iterable[dict], analysis_mode: str, commit_counts: dict) -> Iterator[dict]:
+    if analysis_mode != 'diff':
+        yield from iter_unique_files(files, commit_counts)
+        return
+
+    collapsed = deduplicate_files(list(files))
+    for file_data in collapsed:
+        commit_counts[(file_data.get('author_email'), file_data.get('filename'))] = file_data['commit_count']
+    yield from collapsed
+
+
+def _collect_files(github_url: str, start_date: str, end_date: str, email: str,
+                   analysis_mode: str, commit_counts: dict, commit_dates: dict) -> Iterator[dict]:
+    files = _track_commit_dates(
+        iter_repository_files(github_url, start_date, end_date, email, mode=analysis_mode), commit_dates
+    )
+    yield from collapse_files(files, analysis_mode, commit_counts)
+
+
+def _fetch_stage(files: Iterator[dict], writer: ReportWriter, out_queue: queue.Queue, state: dict):
     try:
-        os.makedirs(report_dir_path, exist_ok=True)
-        report_data = {
-            "report_id": report_id,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "files": files_data
-        }
-        json_path = os.path.join(report_dir_path, f"report_{report_id}.json")
-
-        if not json_path:
-             raise ValueError("Could not determine JSON report file path.")
-
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(report_data, f, ensure_ascii=False, indent=2)
-        logger.info(f"JSON отчет сохранен: {json_path}")
-        return json_path
+        with writer:
+            for file_data in files:
+                writer.write(file_data)
+                while not state.get('cancelled'):
+                    try:
+                        out_queue.put(file_data, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if state.get('cancelled'):
+                    return
     except Exception as e:
-        logger.error(f"Ошибка генерации JSON отчета {report_id}: {str(e)}", exc_info=True)
-        raise
+        logger.error(f"Ошибка этапа загрузки файлов с GitHub: {e}", exc_info=True)
+        state['error'] = e
+    finally:
+        try:
+            files.close()
+        except Exception as e:
+            logger.warning(f"Failed to close GitHub file stream: {e}")
+        while True:
+            try:
+                out_queue.put(_END_OF_STREAM, timeout=1)
+                break
+            except queue.Full:
+                if state.get('cancelled'):
+                    break
+
+
+def _drain_queue(out_queue: queue.Queue, state: dict) -> Iterator[dict]:
+    while True:
+        item = out_queue.get()
+        if item is _END_OF_STREAM:
+            break
+        yield item
+    if state.get('error'):
+        raise RuntimeError("GitHub data retrieval failed") from state['error']
+
 
+def covered_until(report: Report) -> str:
+    requested_end = report.date_range.split(' - ')[1]
+    return min(requested_end, report.created_at.date().isoformat())
 
-def process_report(report_id: str, github_url: str, date_range: str, email: str, user_id: int):
+
+def find_previous_report(report: Report) -> Report | None:
+    start_date, end_date = report.date_range.split(' - ')
+    candidates = Report.query.filter(
+        Report.id != report.id,
+        Report.user_id == report.user_id,
+        Report.github_url == report.github_url,
+        Report.email == report.email,
+        Report.analysis_mode == 'full',
+        Report.status == 'completed',
+        Report.llm_status == 'completed'
+    ).order_by(Report.created_at.desc()).all()
+
+    best, best_end = None, None
+    for candidate in candidates:
+        prev_start, prev_end = candidate.date_range.split(' - ')
+        prev_covered = covered_until(candidate)
+        if not (prev_start <= start_date < prev_covered and prev_end <= end_date):
+            continue
+        analysis_path = candidate.get_analysis_file_path()
+        if not analysis_path or not os.path.exists(analysis_path):
+            continue
+        if best is not None and prev_covered <= best_end:
+            continue
+        try:
+            records = load_previous_analyses(candidate, start_date)
+        except Exception as load_err:
+            logger.warning(f"Could not read analyses of report {candidate.id}: {load_err}")
+            continue
+        if any(record.get('status') not in ANALYZED_STATUSES for record in records):
+            logger.info(f"Not reusing report {candidate.id}: it has failed file analyses "
+                        f"between {start_date} and {prev_covered}")
+            continue
+        best, best_end = candidate, prev_covered
+    return best
+
+
+def load_previous_analyses(previous: Report, start_date: str) -> list:
+    data = read_json_artifact(previous.get_analysis_file_path())
+    end_date = covered_until(previous)
+
+    records = []
+    for record in data.get('files', []):
+        dates = [d for d in record.get('commit_dates') or [] if d and start_date <= d[:10] < end_date]
+        if dates:
+            records.append(dict(record, commit_dates=dates, commit_count=len(dates)))
+    return records
+
+
+def save_analysis_records(report: Report, records: list, commit_dates: dict) -> str:
+    analysis_path = os.path.join(report.report_dir_path, f"analysis_{report.id}.json.gz")
+    files = []
+    for record in records:
+        key = (record.get('author'), record.get('filename'))
+        dates = commit_dates.get(key) or record.get('commit_dates') or []
+        files.append(dict(record, commit_dates=sorted(set(d for d in dates if d), reverse=True)))
+    write_json_artifact(analysis_path, {
+        "report_id": report.id,
+        "date_range": report.date_range,
+        "analysis_mode": report.analysis_mode,
+        "files": files
+    })
+    logger.info(f"[{report.id}] Per-file analyses saved: {analysis_path} ({len(files)} files)")
+    return analysis_path
+
+
+def collect_report_garbage() -> dict:
+    referenced = set()
+    for report in Report.query.all() + BatchReport.query.all():
+        if report.report_dir_path and os.path.isdir(report.report_dir_path):
+            artifact_id = getattr(report, 'artifact_id', report.id)
+            try:
+                referenced |= report_blob_refs(report.report_dir_path, artifact_id,
+                                               scan_report=report.status != 'processing')
+            except Exception as e:
+                logger.error(f"[{report.id}] Could not read blob references, skipping content store GC: {e}")
+                raise
+    return content_store.collect_garbage(referenced, Config.REPORT_BLOB_GC_GRACE_SECONDS)
+
+
+def process_report(report_id: str, github_url: str, date_range: str, email: str, user_id: int, analysis_mode: str = 'full'):
     from app import app
     with app.app_context():
         json_report_path = None
@@ -54,28 +230,50 @@ def process_report(report_id: str, github_url: str, date_range: str, email: str,
              return
 
         try:
-            logger.info(f"Processing report {report_id} for user {user_id} - URL: {github_url}, Range: {date_range}, Email: {email}")
+            logger.info(f"Processing report {report_id} for user {user_id} - URL: {github_url}, Range: {date_range}, Email: {email}, Mode: {analysis_mode}")
             start_date_str, end_date_str = date_range.split(' - ')
 
-            logger.info(f"[{report_id}] Fetching GitHub files...")
-            files_data = get_github_files(github_url, start_date_str, end_date_str, email)
-
-            if files_data is None:
-                 logger.error(f"[{report_id}] Failed to retrieve file data from GitHub.")
-                 raise RuntimeError("GitHub data retrieval failed")
-
-            if not files_data:
-                 logger.warning(f"[{report_id}] No files found on GitHub for the specified criteria.")
-
-            logger.info(f"[{report_id}] Generating JSON report...")
             if not report_to_update.report_dir_path or not os.path.exists(report_to_update.report_dir_path):
                  logger.error(f"[{report_id}] Report directory path is missing or invalid: {report_to_update.report_dir_path}")
                  raise RuntimeError("Report directory invalid")
 
-            json_report_path = generate_json_report(report_id, files_data, report_to_update.report_dir_path)
-            logger.info(f"[{report_id}] JSON report generated at: {json_report_path}")
+            fetch_start_str = start_date_str
+            previous_records = []
+            if analysis_mode == 'full':
+                previous_report = find_previous_report(report_to_update)
+                if previous_report:
+                    try:
+                        previous_records = load_previous_analyses(previous_report, start_date_str)
+                        fetch_start_str = covered_until(previous_report)
+                        logger.info(f"[{report_id}] Reusing {len(previous_records)} analyses from report {previous_report.id} "
+                                    f"({previous_report.date_range}), fetching only {fetch_start_str} - {end_date_str}")
+                    except Exception as prev_err:
+                        logger.warning(f"[{report_id}] Could not load analyses of report {previous_report.id}, "
+                                       f"running full analysis: {prev_err}")
+                        previous_records = []
+
+            logger.info(f"[{report_id}] Starting GitHub fetch stage...")
+            commit_counts = {}
+            commit_dates = {}
+            fetch_state = {}
+            out_queue = queue.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+            writer = ReportWriter(report_id, report_to_update.report_dir_path)
+            json_report_path = writer.path
+            fetcher = threading.Thread(
+                target=_fetch_stage,
+                args=(_collect_files(github_url, fetch_start_str, end_date_str, email, analysis_mode,
+                                     commit_counts, commit_dates),
+                      writer, out_queue, fetch_state),
+                name=f"fetch-{report_id[:8]}",
+                daemon=True
+            )
+            fetcher.start()
+            files_stream = _drain_queue(out_queue, fetch_state)
 
-            if not files_data:
+            first_file = next(files_stream, None)
+            if first_file is None and not previous_records:
+                 fetcher.join()
+                 logger.warning(f"[{report_id}] No files found on GitHub for the specified criteria.")
                  logger.info(f"[{report_id}] No files to analyze with LLM. Marking report as completed (empty).")
                  final_status = 'completed'
                  llm_final_status = 'skipped'
@@ -86,7 +284,7 @@ def process_report(report_id: str, github_url: str, date_range: str, email: str,
                      pdf_report_path = empty_pdf_path
                  except Exception as pdf_err:
                      logger.error(f"[{report_id}] Не удалось создать пустой PDF отчет: {pdf_err}")
-                 return
+                 return final_status
 
             logger.info(f"[{report_id}] Initializing LLM Analyzer...")
             try:
@@ -99,6 +297,7 @@ def process_report(report_id: str, github_url: str, date_range: str, email: str,
             except Exception as init_err:
                  logger.error(f"[{report_id}] Failed to initialize CodeAnalyzer: {init_err}", exc_info=True)
                  llm_final_status = 'failed'
+                 fetch_state['cancelled'] = True
                  raise
 
             if report_to_update in db.session:
@@ -120,16 +319,29 @@ def process_report(report_id: str, github_url: str, date_range: str, email: str,
             target_pdf_path = os.path.join(llm_report_dir, f"analysis_{report_id}.pdf")
 
             try:
-                generated_pdf_path = analyzer.process_json_and_generate_pdf(
-                    input_json_path=json_report_path,
-                    output_pdf_path=target_pdf_path
-                )
+                new_files = [first_file] if first_file is not None else []
+                analyzed_count = analyzer.analyze_files(itertools.chain(new_files, files_stream), commit_counts)
+                fetcher.join()
+                logger.info(f"[{report_id}] Fetched and analyzed {analyzed_count} distinct files "
+                            f"({sum(commit_counts.values())} file versions), JSON report at: {json_report_path}")
+                if previous_records:
+                    analyzer.merge_previous_analyses(previous_records)
+                    for record in previous_records:
+                        key = (record.get('author'), record.get('filename'))
+                        if key in commit_dates:
+                            commit_dates[key].extend(record['commit_dates'])
+                try:
+                    save_analysis_records(report_to_update, analyzer.summaries, commit_dates)
+                except Exception as save_err:
+                    logger.warning(f"[{report_id}] Could not save per-file analyses: {save_err}")
+                generated_pdf_path = analyzer.generate_report_pdf(target_pdf_path)
                 pdf_report_path = generated_pdf_path
                 llm_final_status = 'completed'
                 final_status = 'completed'
                 logger.info(f"[{report_id}] LLM analysis and PDF generation successful: {pdf_report_path}")
 
             except Exception as llm_err:
+                 fetch_state['cancelled'] = True
                  logger.error(f"[{report_id}] Error during LLM processing or PDF generation: {llm_err}", exc_info=True)
                  llm_final_status = 'failed'
                  final_status = 'failed'
@@ -161,4 +373,6 @@ def process_report(report_id: str, github_url: str, date_range: str, email: str,
 
             except Exception as db_err:
                 db.session.rollback()
-                logger.error(f"[{report_id}] CRITICAL: Failed to update database status to '{final_status}' (LLM: '{llm_final_status}'): {db_err}", exc_info=True)
\ No newline at end of file
+                logger.error(f"[{report_id}] CRITICAL: Failed to update database status to '{final_status}' (LLM: '{llm_final_status}'): {db_err}", exc_info=True)
+
+        return final_status
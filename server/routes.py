@@ -1,11 +1,12 @@
 from flask import jsonify, request, send_file, abort
 from datetime import datetime
-from utils import validate_github_url, create_new_report, get_user_reports
+from utils import validate_github_url, create_new_report, get_user_reports, create_batch_report, get_user_batch_reports
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
 import os
-from models import Report
+from models import Report, BatchReport
 from config import Config
+from rate_limiter import rate_governor
 
 logger = logging.getLogger(__name__)
 
@@ -21,11 +22,15 @@ def register_routes(app):
             email = data.get('email')
             start_date = data.get('startDate')
             end_date = data.get('endDate')
+            analysis_mode = data.get('analysisMode')
 
             if not validate_github_url(github_url) or not email or not start_date or not end_date:
                  logger.warning(f"Invalid data received for generate-report from user {current_user_id}")
                  return jsonify({"error": "Некорректные данные репозитория, email или дат"}), 400
 
+            if analysis_mode and analysis_mode not in Config.ANALYSIS_MODES:
+                 return jsonify({"error": "Некорректный режим анализа"}), 400
+
             try:
                 start_dt = datetime.strptime(start_date, "%Y-%m-%d")
                 end_dt = datetime.strptime(end_date, "%Y-%m-%d")
@@ -97,4 +102,92 @@ def register_routes(app):
 
         except Exception as e:
             logger.error(f"Ошибка скачивания отчета {report_id} для пользователя {current_user_id}: {str(e)}", exc_info=True)
-            abort(500, description="Внутренняя ошибка сервера при скачивании отчета.")
\ No newline at end of file
+            abort(500, description="Внутренняя ошибка сервера при скачивании отчета.")
+
+
+    @app.route('/api/batch-reports', methods=['POST'])
+    @jwt_required()
+    def generate_batch_report():
+        current_user_id = get_jwt_identity()
+        try:
+            data = request.json or {}
+            repos = data.get('repos')
+            emails = data.get('emails')
+            start_date = data.get('startDate')
+            end_date = data.get('endDate')
+            analysis_mode = data.get('analysisMode')
+
+            if not isinstance(repos, list) or not isinstance(emails, list) or not repos or not emails \
+                    or not start_date or not end_date:
+                 return jsonify({"error": "Укажите списки репозиториев и email, а также даты"}), 400
+
+            if not all(isinstance(url, str) and validate_github_url(url) for url in repos) \
+                    or not all(isinstance(email, str) and email.strip() for email in emails):
+                 logger.warning(f"Invalid data received for batch-reports from user {current_user_id}")
+                 return jsonify({"error": "Некорректные данные репозиториев или email"}), 400
+
+            if len(repos) > Config.BATCH_MAX_REPOS or len(emails) > Config.BATCH_MAX_AUTHORS:
+                 return jsonify({"error": f"Не более {Config.BATCH_MAX_REPOS} репозиториев и "
+                                          f"{Config.BATCH_MAX_AUTHORS} авторов в одном пакете"}), 400
+
+            if analysis_mode and analysis_mode not in Config.ANALYSIS_MODES:
+                 return jsonify({"error": "Некорректный режим анализа"}), 400
+
+            try:
+                start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+                end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+                if end_dt < start_dt:
+                     return jsonify({"error": "Дата окончания не может быть раньше даты начала"}), 400
+            except ValueError:
+                return jsonify({"error": "Некорректный формат даты (YYYY-MM-DD)"}), 400
+
+            batch_data = create_batch_report(data, current_user_id)
+            logger.info(f"Batch report creation initiated: {batch_data.get('id')} by user {current_user_id}")
+            return jsonify(batch_data), 201
+
+        except Exception as e:
+            logger.error(f"Ошибка в generate_batch_report для пользователя {current_user_id}: {str(e)}", exc_info=True)
+            return jsonify({"error": "Внутренняя ошибка сервера при создании пакетного отчета"}), 500
+
+
+    @app.route('/api/batch-reports', methods=['GET'])
+    @jwt_required()
+    def get_batch_reports():
+        current_user_id = get_jwt_identity()
+        return jsonify(get_user_batch_reports(current_user_id))
+
+
+    @app.route('/api/batch-reports/<string:batch_id>/download', methods=['GET'])
+    @jwt_required()
+    def download_batch_report(batch_id):
+        user_id_int = int(get_jwt_identity())
+        batch = BatchReport.query.filter_by(id=batch_id, user_id=user_id_int).first()
+        if not batch:
+            abort(404, description="Отчет не найден или у вас нет доступа.")
+        if batch.status != 'completed':
+            if batch.status == 'failed':
+                abort(400, description="Произошла ошибка при создании отчета. Скачивание невозможно.")
+            abort(400, description="Отчет еще не готов для скачивания.")
+
+        author = request.args.get('author')
+        if author:
+            pdf_path = batch.get_results().get(author, {}).get('pdf_path')
+            if not pdf_path:
+                abort(404, description="Для этого автора отчет не сформирован.")
+            filename = f"CodeAnalysis_{author.split('@')[0]}_{batch_id[:8]}.pdf"
+        else:
+            pdf_path = batch.summary_pdf_path
+            filename = f"CodeAnalysis_summary_{batch_id[:8]}.pdf"
+
+        if not pdf_path or not os.path.exists(pdf_path):
+             logger.error(f"Download failed: PDF file missing for batch report {batch_id}. Path: {pdf_path}")
+             abort(500, description="Файл отчета не найден на сервере.")
+
+        logger.info(f"User {user_id_int} downloading batch report {batch_id} from {pdf_path} as {filename}")
+        return send_file(pdf_path, as_attachment=True, download_name=filename, mimetype='application/pdf')
+
+
+    @app.route('/api/github/rate-limit', methods=['GET'])
+    @jwt_required()
+    def get_github_rate_limit():
+        return jsonify(rate_governor.snapshot())
\ No newline at end of file
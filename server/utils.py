@@ -1,11 +1,11 @@
 import uuid
-import threading
-from reports import process_report
+import json
+import hashlib
 from config import Config
 import os
 import logging
-from models import db, Report
-from flask import current_app
+from models import db, Report, BatchReport
+from job_queue import enqueue_job, report_job_payload, find_inflight_leader, settle_follower
 
 logger = logging.getLogger(__name__)
 
@@ -13,42 +13,59 @@ logger = logging.getLogger(__name__)
 def validate_github_url(url: str) -> bool:
     return url is not None and url.startswith("https://github.com/") and len(url.split("/")) >= 5
 
+def make_report_dedup_key(github_url: str, email: str, date_range: str, analysis_mode: str) -> str:
+    normalized_url = github_url.strip().lower().rstrip('/')
+    if normalized_url.endswith('.git'):
+        normalized_url = normalized_url[:-4]
+    parts = [normalized_url, email.strip(), date_range.replace(' ', ''), analysis_mode]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
 def create_new_report(data: dict, user_id: str) -> dict:
     report_id = str(uuid.uuid4())
-    report_dir_path = os.path.join(Config.REPORT_DIR, report_id)
+    date_range = f"{data['startDate']} - {data['endDate']}"
+    analysis_mode = data.get('analysisMode') or Config.REPORT_ANALYSIS_MODE
+    email = data['email'].strip()
+    dedup_key = make_report_dedup_key(data['githubUrl'], email, date_range, analysis_mode)
+    leader = find_inflight_leader(dedup_key)
+
+    report_dir_path = leader.report_dir_path if leader else os.path.join(Config.REPORT_DIR, report_id)
     llm_report_dir_path = os.path.join(Config.LLM_REPORT_DIR, report_id)
 
     try:
-        os.makedirs(report_dir_path, exist_ok=True)
-        logger.info(f"Created directory for JSON report {report_id}: {report_dir_path}")
-        os.makedirs(llm_report_dir_path, exist_ok=True)
-        logger.info(f"Created directory for LLM report {report_id}: {llm_report_dir_path}")
+        if not leader:
+            os.makedirs(report_dir_path, exist_ok=True)
+            logger.info(f"Created directory for JSON report {report_id}: {report_dir_path}")
+            os.makedirs(llm_report_dir_path, exist_ok=True)
+            logger.info(f"Created directory for LLM report {report_id}: {llm_report_dir_path}")
 
         user_id_int = int(user_id)
 
         new_db_report = Report(
             id=report_id,
             github_url=data['githubUrl'],
-            email=data['email'],
-            date_range=f"{data['startDate']} - {data['endDate']}",
+            email=email,
+            date_range=date_range,
             status='processing',
             user_id=user_id_int,
             report_dir_path=report_dir_path,
             llm_status='pending',
-            pdf_report_path=None
+            pdf_report_path=None,
+            analysis_mode=analysis_mode,
+            dedup_key=dedup_key,
+            leader_id=leader.id if leader else None
         )
 
         db.session.add(new_db_report)
-        db.session.commit()
-        logger.info(f"Report {report_id} added to database for user {user_id_int}")
-
-        app = current_app._get_current_object()
-        logger.info(f"Starting report processing thread for report {report_id} (user {user_id_int})")
-        thread = threading.Thread(
-            target=process_report,
-            args=(report_id, new_db_report.github_url, new_db_report.date_range, new_db_report.email, user_id_int)
-        )
-        thread.start()
+        db.session.flush()
+        if leader:
+            new_db_report.llm_status = leader.llm_status
+            db.session.commit()
+            logger.info(f"Report {report_id} for user {user_id_int} attached to in-flight report {leader.id}")
+            settle_follower(new_db_report)
+        else:
+            enqueue_job('report', report_job_payload(new_db_report), report_id=report_id, commit=False)
+            db.session.commit()
+            logger.info(f"Report {report_id} added to database and queued for user {user_id_int}")
 
         return {
             'id': new_db_report.id,
@@ -57,18 +74,20 @@ def create_new_report(data: dict, user_id: str) -> dict:
             'dateRange': new_db_report.date_range,
             'status': new_db_report.status,
             'createdAt': new_db_report.created_at.isoformat(),
-            'llm_status': new_db_report.llm_status
+            'llm_status': new_db_report.llm_status,
+            'analysisMode': new_db_report.analysis_mode
         }
 
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error creating report entry for user {user_id}: {e}", exc_info=True)
-        if os.path.exists(report_dir_path):
-             try: os.rmdir(report_dir_path)
-             except OSError: logger.warning(f"Could not remove dir {report_dir_path}")
-        if os.path.exists(llm_report_dir_path):
-             try: os.rmdir(llm_report_dir_path)
-             except OSError: logger.warning(f"Could not remove dir {llm_report_dir_path}")
+        if not leader:
+            if os.path.exists(report_dir_path):
+                 try: os.rmdir(report_dir_path)
+                 except OSError: logger.warning(f"Could not remove dir {report_dir_path}")
+            if os.path.exists(llm_report_dir_path):
+                 try: os.rmdir(llm_report_dir_path)
+                 except OSError: logger.warning(f"Could not remove dir {llm_report_dir_path}")
         raise
 
 def get_user_reports(user_id: str) -> list:
@@ -87,6 +106,7 @@ def get_user_reports(user_id: str) -> list:
                 'status': r.status,
                 'createdAt': r.created_at.isoformat(),
                 'llm_status': r.llm_status,
+                'analysisMode': r.analysis_mode,
                 'hasPdf': bool(r.pdf_report_path and r.status == 'completed')
             } for r in user_reports_db
         ]
@@ -95,4 +115,64 @@ def get_user_reports(user_id: str) -> list:
 
     except Exception as e:
         logger.error(f"Error fetching reports for user {user_id}: {e}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+
+def _batch_report_dict(batch: BatchReport) -> dict:
+    results = batch.get_results()
+    return {
+        'id': batch.id,
+        'repos': batch.get_repos(),
+        'emails': batch.get_emails(),
+        'dateRange': batch.date_range,
+        'status': batch.status,
+        'createdAt': batch.created_at.isoformat(),
+        'analysisMode': batch.analysis_mode,
+        'hasSummary': bool(batch.summary_pdf_path and batch.status == 'completed'),
+        'authors': {email: {'files': result.get('files', 0), 'hasPdf': bool(result.get('pdf_path'))}
+                    for email, result in results.items()}
+    }
+
+def create_batch_report(data: dict, user_id: str) -> dict:
+    batch_id = str(uuid.uuid4())
+    report_dir_path = os.path.join(Config.REPORT_DIR, f"batch_{batch_id}")
+    repos = list(dict.fromkeys(url.strip().rstrip('/') for url in data['repos']))
+    emails = list(dict.fromkeys(email.strip() for email in data['emails']))
+
+    try:
+        os.makedirs(report_dir_path, exist_ok=True)
+        user_id_int = int(user_id)
+
+        batch = BatchReport(
+            id=batch_id,
+            repos=json.dumps(repos, ensure_ascii=False),
+            emails=json.dumps(emails, ensure_ascii=False),
+            date_range=f"{data['startDate']} - {data['endDate']}",
+            analysis_mode=data.get('analysisMode') or Config.REPORT_ANALYSIS_MODE,
+            status='processing',
+            report_dir_path=report_dir_path,
+            user_id=user_id_int
+        )
+        db.session.add(batch)
+        db.session.flush()
+        enqueue_job('batch_report', {'batch_id': batch_id}, commit=False)
+        db.session.commit()
+        logger.info(f"Batch report {batch_id} ({len(repos)} repos, {len(emails)} authors) queued for user {user_id_int}")
+        return _batch_report_dict(batch)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating batch report entry for user {user_id}: {e}", exc_info=True)
+        if os.path.exists(report_dir_path):
+             try: os.rmdir(report_dir_path)
+             except OSError: logger.warning(f"Could not remove dir {report_dir_path}")
+        raise
+
+def get_user_batch_reports(user_id: str) -> list:
+    try:
+        batches = BatchReport.query.filter_by(user_id=int(user_id))\
+                                   .order_by(BatchReport.created_at.desc())\
+                                   .all()
+        return [_batch_report_dict(batch) for batch in batches]
+    except Exception as e:
+        logger.error(f"Error fetching batch reports for user {user_id}: {e}", exc_info=True)
+        return []
@@ -0,0 +1,144 @@
+import time
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def run_report_job(payload: dict):
+    from reports import process_report
+    final_status = process_report(**payload)
+    if final_status == 'failed':
+        raise RuntimeError(f"Report {payload.get('report_id')} processing failed")
+
+
+def run_batch_job(payload: dict):
+    from batch_reports import process_batch_report
+    final_status = process_batch_report(payload['batch_id'])
+    if final_status == 'failed':
+        raise RuntimeError(f"Batch report {payload.get('batch_id')} processing failed")
+
+
+JOB_HANDLERS = {
+    'report': run_report_job,
+    'batch_report': run_batch_job,
+}
+
+
+def run_job(job):
+    from models import db
+    from job_queue import complete_job, fail_job
+
+    handler = JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        fail_job(job.id, f"Unknown job kind: {job.kind}")
+        return
+
+    logger.info(f"Running job {job.id} ({job.kind}), attempt {job.attempts}/{job.max_attempts}")
+    started = time.monotonic()
+    try:
+        handler(job.get_payload())
+        complete_job(job.id)
+    except Exception as e:
+        logger.error(f"Job {job.id} ({job.kind}) raised: {e}", exc_info=True)
+        db.session.rollback()
+        fail_job(job.id, str(e))
+    finally:
+        logger.info(f"Job {job.id} finished in {time.monotonic() - started:.1f}s")
+
+
+def worker_loop(slot: int, stop_event: threading.Event):
+    from app import app
+    from models import db
+    from job_queue import claim_next_job, make_worker_id
+
+    worker_id = make_worker_id(str(slot))
+    logger.info(f"Worker {worker_id} started")
+    with app.app_context():
+        while not stop_event.is_set():
+            try:
+                job = claim_next_job(worker_id)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} failed to claim a job: {e}", exc_info=True)
+                db.session.rollback()
+                job = None
+
+            if job is None:
+                stop_event.wait(Config.WORKER_POLL_INTERVAL)
+                continue
+            run_job(job)
+            db.session.remove()
+    logger.info(f"Worker {worker_id} stopped")
+
+
+def recover():
+    from app import app
+    from models import db
+    from job_queue import recover_jobs
+    with app.app_context():
+        try:
+            recovered = recover_jobs()
+        finally:
+            db.session.remove()
+            db.engine.dispose()
+    if recovered:
+        logger.warning(f"Recovered {recovered} interrupted job(s)")
+
+
+def _process_main(slot: int):
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    worker_loop(slot, stop_event)
+
+
+_embedded_stop_event = None
+_embedded_lock = threading.RLock()
+
+
+def start_embedded_workers(count: int) -> threading.Event:
+    global _embedded_stop_event
+    with _embedded_lock:
+        if _embedded_stop_event is not None:
+            return _embedded_stop_event
+        recover()
+        _embedded_stop_event = stop_event = threading.Event()
+        for slot in range(count):
+            thread = threading.Thread(target=worker_loop, args=(slot, stop_event),
+                                      name=f"report-worker-{slot}", daemon=True)
+            thread.start()
+    logger.warning(f"Started {count} embedded worker thread(s)")
+    return stop_event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report job worker pool")
+    parser.add_argument('--processes', type=int, default=Config.WORKER_PROCESSES,
+                        help="number of worker processes (bounded report concurrency)")
+    args = parser.parse_args()
+
+    recover()
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(slot,), name=f"report-worker-{slot}")
+        for slot in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    logger.warning(f"Started {len(processes)} worker process(es)")
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == '__main__':
+    main()